@@ -38,10 +38,107 @@ ENTREGABLES:
 """
 
 from abc import ABC, abstractmethod
+from array import array
+from collections import deque, namedtuple
+from itertools import count, islice
 from typing import List, Dict
+import atexit
+import bisect
+import csv
+import heapq
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import unicodedata
+
+#Cantidad maxima de precios recordados por producto
+MAX_HISTORIAL_PRECIOS = 10
+
+#Desglose de precio memorizado por producto
+DesglosePrecio = namedtuple("DesglosePrecio", ["base", "descuento", "precio", "envio", "impuesto", "final"])
+
+#Eventos de inventario: se acumulan en un sumidero y se vacian por lotes
+Evento = namedtuple("Evento", ["tipo", "codigo_SKU", "nombre", "valor_anterior", "valor_nuevo"])
+
+class SumideroEventos:
+    def __init__(self, destino, tamano_lote=1_000):
+        #destino recibe una lista de Evento (archivo, cola, callback...)
+        self.destino = destino
+        self.tamano_lote = tamano_lote
+        self.__buffer = []
+        self.__lock = threading.Lock()
+
+    def emitir(self, tipo, producto, valor_anterior, valor_nuevo):
+        with self.__lock:
+            self.__buffer.append(Evento(tipo, producto.codigo_SKU, producto.nombre, valor_anterior, valor_nuevo))
+            lleno = len(self.__buffer) >= self.tamano_lote
+        if lleno:
+            self.vaciar()
+
+    def vaciar(self):
+        with self.__lock:
+            lote, self.__buffer = self.__buffer, []
+        if lote:
+            self.destino(lote)
+
+    @classmethod
+    def a_archivo(cls, ruta, tamano_lote=1_000):
+        def escribir(lote):
+            with open(ruta, "a", encoding="utf-8") as archivo:
+                archivo.writelines(json.dumps(evento._asdict(), ensure_ascii=False) + "\n" for evento in lote)
+        return cls(escribir, tamano_lote)
+
+    @classmethod
+    def a_cola(cls, cola, tamano_lote=1_000):
+        return cls(cola.put, tamano_lote)
+
+class SumideroNulo:
+    #Para cargas masivas: los eventos se descartan sin costo
+    def emitir(self, tipo, producto, valor_anterior, valor_nuevo):
+        pass
+
+    def vaciar(self):
+        pass
+
+def imprimir_eventos(lote):
+    mensajes = {
+        "stock_bajo": "ALERTA: Stock bajo para {nombre} - Solo {valor_nuevo} unidades",
+        "precio_actualizado": "Precio actualizado para {nombre}: ${valor_nuevo}",
+        "descuento_aplicado": "Descuento del {valor_nuevo}% aplicado a {nombre}",
+    }
+    print("\n".join(mensajes[evento.tipo].format(**evento._asdict()) for evento in lote))
 
 # 1. Abstraccion 
 class Producto(ABC):
+    #__slots__ evita un __dict__ por instancia (catalogos grandes en memoria)
+    __slots__ = ("__nombre", "__codigo_SKU", "__precio", "__stock", "__categoria",
+                 "_descuento_actual", "__historial_precios", "_observadores", "_desglose")
+
+    #Contadores globales de la cache de precios (monitoreo)
+    _aciertos_cache = 0
+    _fallos_cache = 0
+
+    #Sumidero de eventos compartido; los setters no hacen I/O directamente
+    sumidero = SumideroEventos(imprimir_eventos)
+
+    #Envio = base + peso_kg * por_kg + duracion_horas * por_hora; cada tipo fija sus constantes
+    ENVIO_BASE = 0.0
+    ENVIO_POR_KG = 0.0
+    ENVIO_POR_HORA = 0.0
+    TASA_IMPUESTO = 0.19
+
+    @classmethod
+    def configurar_sumidero(cls, sumidero):
+        Producto.sumidero.vaciar()
+        Producto.sumidero = sumidero
+
     def __init__(self, nombre, codigo_SKU, precio, stock, categoria):
         self.__nombre = nombre
         self.__codigo_SKU = codigo_SKU
@@ -49,12 +146,20 @@ class Producto(ABC):
         self.__stock = stock
         self.__categoria = categoria
         self._descuento_actual = 0.0
-        self.__historial_precios = [precio]
+        #El historial solo se crea en el primer cambio de precio y esta acotado
+        self.__historial_precios = None
+        self._observadores = ()
+        self._desglose = None
 
     #metodos abstractos
     @abstractmethod
     def calcular_costo_envio(self):
         pass
+
+    #Formula unica de envio: la usan calcular_costo_envio() y ColumnasCatalogo
+    @classmethod
+    def costo_envio_para(cls, peso_kg=0.0, duracion_horas=0.0):
+        return cls.ENVIO_BASE + peso_kg * cls.ENVIO_POR_KG + duracion_horas * cls.ENVIO_POR_HORA
     
     @abstractmethod
     def tiempo_entrega(self):
@@ -64,19 +169,53 @@ class Producto(ABC):
     def aplicar_descuento(self, porcentaje):
         if porcentaje < 0 or porcentaje > 100:
             raise ValueError ("El descuento debe estar entre 0 y 100")
+        anterior = self._descuento_actual
         self._descuento_actual = porcentaje
-        print(f"Descuento del {porcentaje}% aplicado a {self.nombre}")
+        self._desglose = None
+        Producto.sumidero.emitir("descuento_aplicado", self, anterior, porcentaje)
+        self._notificar_cambio("descuento", anterior)
     
     def calcular_precio_final(self):
-        return self.precio + self.calcular_costo_envio() + self.__calcular_impuestos()
+        return self.desglose_precio().final
+
+    def desglose_precio(self):
+        #Se recalcula solo si cambio el precio, el descuento o un atributo de envio
+        if self._desglose is not None:
+            Producto._aciertos_cache += 1
+            return self._desglose
+        Producto._fallos_cache += 1
+        precio = self.precio
+        envio = self.calcular_costo_envio()
+        impuesto = self.__calcular_impuestos(precio)
+        self._desglose = DesglosePrecio(self.__precio, round(self.__precio - precio, 2), precio,
+                                        envio, impuesto, precio + envio + impuesto)
+        return self._desglose
+
+    def _invalidar_desglose(self):
+        self._desglose = None
+
+    @classmethod
+    def estadisticas_cache(cls):
+        total = Producto._aciertos_cache + Producto._fallos_cache
+        return {
+            "aciertos": Producto._aciertos_cache,
+            "fallos": Producto._fallos_cache,
+            "tasa_aciertos": Producto._aciertos_cache / total if total else 0.0,
+        }
+
+    @classmethod
+    def reiniciar_estadisticas_cache(cls):
+        Producto._aciertos_cache = 0
+        Producto._fallos_cache = 0
 
     def mostrar_info(self):
+        desglose = self.desglose_precio()
         return f"""
 {self.nombre} ({self.codigo_SKU})
-Precio: ${self.precio} (Stock: {self.stock})
+Precio: ${desglose.precio} (Stock: {self.stock})
 Categoria: {self.categoria}
-Envio: ${self.calcular_costo_envio()} - {self.tiempo_entrega()}
-Precio final: ${self.calcular_precio_final()}
+Envio: ${desglose.envio} - {self.tiempo_entrega()}
+Precio final: ${desglose.final}
 """
 
     #3. Encapsulamiento
@@ -87,6 +226,10 @@ Precio final: ${self.calcular_precio_final()}
     @property
     def codigo_SKU(self):
         return self.__codigo_SKU
+
+    @property
+    def precio_base(self):
+        return self.__precio
     
     @property
     def precio(self):
@@ -95,11 +238,15 @@ Precio final: ${self.calcular_precio_final()}
     
     @precio.setter
     def precio(self, nuevo_precio):
-        if nuevo_precio < 0:
-            raise ValueError("El precio no puede ser negativo")
+        Producto._validar_precio(nuevo_precio)
+        anterior = self.__precio
         self.__precio = nuevo_precio
+        self._desglose = None
+        if self.__historial_precios is None:
+            self.__historial_precios = deque([anterior], maxlen=MAX_HISTORIAL_PRECIOS)
         self.__historial_precios.append(nuevo_precio)
-        print(f"Precio actualizado para {self.__nombre}: ${nuevo_precio}")
+        Producto.sumidero.emitir("precio_actualizado", self, anterior, nuevo_precio)
+        self._notificar_cambio("precio", anterior)
     
     @property
     def stock(self):
@@ -107,33 +254,93 @@ Precio final: ${self.calcular_precio_final()}
     
     @stock.setter
     def stock(self, nuevo_stock):
-        if nuevo_stock < 0:
-            raise ValueError("El stock no puede ser negativo")
-        if nuevo_stock < 5 and self.__stock >= 5:
-            print(f"ALERTA: Stock bajo para {self.__nombre} - Solo {nuevo_stock} unidades")
+        anterior = self._fijar_stock(nuevo_stock)
+        self._avisar_stock(anterior, nuevo_stock)
+
+    #Separados para que MotorReservas cambie el stock bajo sus locks y avise despues de soltarlos
+    def _fijar_stock(self, nuevo_stock):
+        Producto._validar_stock(nuevo_stock)
+        anterior = self.__stock
         self.__stock = nuevo_stock
+        return anterior
+
+    def _avisar_stock(self, anterior, nuevo_stock):
+        if nuevo_stock < 5 and anterior >= 5:
+            Producto.sumidero.emitir("stock_bajo", self, anterior, nuevo_stock)
+        self._notificar_cambio("stock", anterior)
     
     @property
     def categoria(self):
         return self.__categoria
+
+    @property
+    def historial_precios(self):
+        if self.__historial_precios is None:
+            return [self.__precio]
+        return list(self.__historial_precios)
     
-    def __calcular_impuestos(self):
-        return self.precio * 0.19
+    #Reglas de validacion compartidas por los setters y el importador
+    @staticmethod
+    def _validar_precio(precio):
+        if precio < 0:
+            raise ValueError("El precio no puede ser negativo")
+
+    @staticmethod
+    def _validar_stock(stock):
+        if stock < 0:
+            raise ValueError("El stock no puede ser negativo")
+
+    def __calcular_impuestos(self, precio):
+        return precio * self.TASA_IMPUESTO
+
+    #Observadores (catalogos que indexan este producto)
+    def _suscribir(self, observador):
+        self._observadores = self._observadores + (observador,)
+
+    def _desuscribir(self, observador):
+        self._observadores = tuple(o for o in self._observadores if o is not observador)
+
+    def _notificar_cambio(self, campo, valor_anterior):
+        for observador in self._observadores:
+            observador._producto_modificado(self, campo, valor_anterior)
 
 # 2. Herencia
 
 class producto_fisico(Producto):
+    __slots__ = ("__peso_kg", "dimensiones", "__almacen_ubicacion")
+    ENVIO_BASE = 5.0
+    ENVIO_POR_KG = 2.0
+
     def __init__(self, nombre, codigo_SKU, precio, stock, peso_kg, dimensiones, almacen_ubicacion):
         super().__init__(nombre, codigo_SKU, precio, stock, "Fisico")
-        self.peso_kg = peso_kg
+        self.__peso_kg = peso_kg
         self.dimensiones = dimensiones
-        self.almacen_ubicacion = almacen_ubicacion
+        self.__almacen_ubicacion = almacen_ubicacion
+
+    @property
+    def peso_kg(self):
+        return self.__peso_kg
+
+    @peso_kg.setter
+    def peso_kg(self, nuevo_peso):
+        anterior = self.__peso_kg
+        self.__peso_kg = nuevo_peso
+        self._invalidar_desglose()
+        self._notificar_cambio("peso_kg", anterior)
+
+    @property
+    def almacen_ubicacion(self):
+        return self.__almacen_ubicacion
+
+    @almacen_ubicacion.setter
+    def almacen_ubicacion(self, nuevo_almacen):
+        anterior = self.__almacen_ubicacion
+        self.__almacen_ubicacion = nuevo_almacen
+        self._notificar_cambio("almacen_ubicacion", anterior)
     
     #4. Polimorfismo - implementacion especifica
     def calcular_costo_envio(self):
-        costo_base = 5.0
-        costo_por_kg = 2.0
-        return costo_base + (self.peso_kg * costo_por_kg)
+        return self.costo_envio_para(peso_kg=self.peso_kg)
     
     def tiempo_entrega(self):
         if "Bogota" in self.almacen_ubicacion:
@@ -144,12 +351,24 @@ class producto_fisico(Producto):
             return "3-5 dias habiles"
 
 class producto_digital(Producto):
+    __slots__ = ("tamaño_archivo_mb", "__formato", "url_descarga", "licencia")
+
     def __init__(self, nombre, codigo_SKU, precio, stock, tamaño_archivo_mb, formato, url_descarga, licencia):
         super().__init__(nombre, codigo_SKU, precio, stock, "Digital")
         self.tamaño_archivo_mb = tamaño_archivo_mb
-        self.formato = formato
+        self.__formato = formato
         self.url_descarga = url_descarga
         self.licencia = licencia
+
+    @property
+    def formato(self):
+        return self.__formato
+
+    @formato.setter
+    def formato(self, nuevo_formato):
+        anterior = self.__formato
+        self.__formato = nuevo_formato
+        self._notificar_cambio("formato", anterior)
     
     #4. Polimorfismo - implementacion especifica
     def calcular_costo_envio(self):
@@ -159,25 +378,52 @@ class producto_digital(Producto):
         return "Inmediato - Descarga instantanea"
     
 class servicio(Producto):
+    __slots__ = ("__duracion_horas", "profesional_asignado", "fecha_prestacion")
+    ENVIO_BASE = 20.0
+    ENVIO_POR_HORA = 5.0
+
     def __init__(self, nombre, codigo_SKU, precio, stock, duracion_horas, profesional_asignado, fecha_prestacion):
         super().__init__(nombre, codigo_SKU, precio, stock, "Servicio")
-        self.duracion_horas = duracion_horas
+        self.__duracion_horas = duracion_horas
         self.profesional_asignado = profesional_asignado
         self.fecha_prestacion = fecha_prestacion
+
+    @property
+    def duracion_horas(self):
+        return self.__duracion_horas
+
+    @duracion_horas.setter
+    def duracion_horas(self, nuevas_horas):
+        anterior = self.__duracion_horas
+        self.__duracion_horas = nuevas_horas
+        self._invalidar_desglose()
+        self._notificar_cambio("duracion_horas", anterior)
     
     #4. Polimorfismo - implementacion especifica
     def calcular_costo_envio(self):
-        return 20.0 + (self.duracion_horas * 5.0)
+        return self.costo_envio_para(duracion_horas=self.duracion_horas)
     
     def tiempo_entrega(self):
         return f"Asignado para {self.fecha_prestacion}"
 
 class suscripcion(Producto):
+    __slots__ = ("periodo", "auto_renovable", "__beneficios")
+
     def __init__(self, nombre, codigo_SKU, precio, stock, periodo, auto_renovable, beneficios ):
         super().__init__(nombre, codigo_SKU, precio, stock, "Suscripcion")
         self.periodo = periodo
         self.auto_renovable = auto_renovable
-        self.beneficios = beneficios
+        self.__beneficios = beneficios
+
+    @property
+    def beneficios(self):
+        return self.__beneficios
+
+    @beneficios.setter
+    def beneficios(self, nuevos_beneficios):
+        anterior = self.__beneficios
+        self.__beneficios = nuevos_beneficios
+        self._notificar_cambio("beneficios", anterior)
     
     #4. Polimorfismo - implementacion especifica
     def calcular_costo_envio(self):
@@ -187,14 +433,573 @@ class suscripcion(Producto):
         return "Inmediato - Activacion al instante"
     
 
+#Almacenamiento columnar (opcional) para calculos de precios en lote
+
+class ColumnasCatalogo:
+    #Precios en lote sobre arrays: sigue siendo un bucle de Python por fila, pero sin
+    #pasar por los objetos Producto. Envio e impuesto usan las formulas de cada tipo
+    CATEGORIAS = ("Fisico", "Digital", "Servicio", "Suscripcion")
+    TIPOS = (producto_fisico, producto_digital, servicio, suscripcion)
+
+    def __init__(self):
+        self.skus = []
+        self.__posiciones = {}
+        self.precio = array("d")
+        #Precio con descuento ya redondeado, se mantiene en cada cambio de precio/descuento
+        self.precio_descuento = array("d")
+        self.stock = array("q")
+        self.descuento = array("d")
+        self.peso_kg = array("d")
+        self.duracion_horas = array("d")
+        self.categoria = array("b")
+
+    def __len__(self):
+        return len(self.skus)
+
+    def agregar(self, producto):
+        self.__posiciones[producto.codigo_SKU] = len(self.skus)
+        self.skus.append(producto.codigo_SKU)
+        self.precio.append(producto.precio_base)
+        self.precio_descuento.append(producto.precio)
+        self.stock.append(producto.stock)
+        self.descuento.append(producto._descuento_actual)
+        self.peso_kg.append(getattr(producto, "peso_kg", 0.0))
+        self.duracion_horas.append(getattr(producto, "duracion_horas", 0.0))
+        self.categoria.append(self.CATEGORIAS.index(producto.categoria))
+
+    def actualizar(self, producto):
+        i = self.__posiciones[producto.codigo_SKU]
+        self.precio[i] = producto.precio_base
+        self.precio_descuento[i] = producto.precio
+        self.stock[i] = producto.stock
+        self.descuento[i] = producto._descuento_actual
+        self.peso_kg[i] = getattr(producto, "peso_kg", 0.0)
+        self.duracion_horas[i] = getattr(producto, "duracion_horas", 0.0)
+
+    def eliminar(self, codigo_SKU):
+        #Se mueve la ultima fila al hueco para eliminar en O(1)
+        i = self.__posiciones.pop(codigo_SKU)
+        ultimo = len(self.skus) - 1
+        columnas = (self.skus, self.precio, self.precio_descuento, self.stock, self.descuento,
+                    self.peso_kg, self.duracion_horas, self.categoria)
+        if i != ultimo:
+            for columna in columnas:
+                columna[i] = columna[ultimo]
+            self.__posiciones[self.skus[i]] = i
+        for columna in columnas:
+            columna.pop()
+
+    def calcular_precios(self):
+        costo_envio = [tipo.costo_envio_para for tipo in self.TIPOS]
+        tasa = Producto.TASA_IMPUESTO
+        precios = self.precio_descuento
+        envios = array("d", [costo_envio[c](kg, h)
+                             for c, kg, h in zip(self.categoria, self.peso_kg, self.duracion_horas)])
+        impuestos = array("d", [p * tasa for p in precios])
+        finales = array("d", [p + e + i for p, e, i in zip(precios, envios, impuestos)])
+        return {
+            "sku": self.skus,
+            "precio": precios,
+            "envio": envios,
+            "impuesto": impuestos,
+            "precio_final": finales,
+        }
+
+
+#Busqueda de texto: indice invertido de terminos y prefijos
+
+ResultadoBusqueda = namedtuple("ResultadoBusqueda", ["total", "pagina", "productos"])
+
+class IndiceBusqueda:
+    #Peso de cada campo en el ranking
+    PESOS = {"nombre": 3, "beneficios": 2, "categoria": 1, "formato": 1}
+    BONO_EXACTO = 1
+    #Terminos nuevos que se revisan linealmente antes de reordenar el vocabulario
+    MAX_PENDIENTES = 1_000
+
+    def __init__(self):
+        self.__terminos = {}          #termino -> {sku: peso}
+        self.__terminos_por_sku = {}  #sku -> {termino: peso} (para reindexar/eliminar)
+        #Vocabulario ordenado para resolver prefijos con busqueda binaria
+        self.__vocabulario = []
+        self.__pendientes = set()
+
+    @staticmethod
+    def normalizar(texto):
+        texto = str(texto).lower()
+        if not texto.isascii():
+            texto = unicodedata.normalize("NFKD", texto)
+            texto = "".join(c for c in texto if not unicodedata.combining(c))
+        return re.findall(r"[a-z0-9]+", texto)
+
+    def indexar(self, producto):
+        sku = producto.codigo_SKU
+        self.eliminar(sku)
+        pesos = {}
+        campos = {
+            "nombre": [producto.nombre],
+            "categoria": [producto.categoria],
+            "formato": [getattr(producto, "formato", "")],
+            "beneficios": getattr(producto, "beneficios", None) or [],
+        }
+        for campo, textos in campos.items():
+            for texto in textos:
+                for termino in self.normalizar(texto):
+                    pesos[termino] = pesos.get(termino, 0) + self.PESOS[campo]
+        for termino, peso in pesos.items():
+            postings = self.__terminos.get(termino)
+            if postings is None:
+                postings = self.__terminos[termino] = {}
+                #Un termino que se borro y vuelve ya esta en el vocabulario ordenado
+                if not self.__en_vocabulario(termino):
+                    self.__pendientes.add(termino)
+            postings[sku] = peso
+        self.__terminos_por_sku[sku] = pesos
+
+    def eliminar(self, codigo_SKU):
+        pesos = self.__terminos_por_sku.pop(codigo_SKU, None)
+        if not pesos:
+            return
+        for termino in pesos:
+            postings = self.__terminos[termino]
+            del postings[codigo_SKU]
+            if not postings:
+                #Si queda en el vocabulario ordenado se descarta al consultarlo
+                del self.__terminos[termino]
+                self.__pendientes.discard(termino)
+
+    def __en_vocabulario(self, termino):
+        i = bisect.bisect_left(self.__vocabulario, termino)
+        return i < len(self.__vocabulario) and self.__vocabulario[i] == termino
+
+    def expandir(self, prefijo):
+        if len(self.__pendientes) > self.MAX_PENDIENTES:
+            self.__vocabulario = sorted([t for t in self.__vocabulario if t in self.__terminos] + list(self.__pendientes))
+            self.__pendientes = set()
+        inicio = bisect.bisect_left(self.__vocabulario, prefijo)
+        fin = bisect.bisect_left(self.__vocabulario, prefijo + "\uffff")
+        terminos = [t for t in self.__vocabulario[inicio:fin] if t in self.__terminos]
+        terminos.extend(t for t in self.__pendientes if t.startswith(prefijo))
+        return terminos
+
+    def puntuar(self, texto):
+        #Todos los terminos deben coincidir; el ultimo se trata como prefijo (typeahead)
+        terminos = self.normalizar(texto)
+        if not terminos:
+            return {}
+        completos, ultimo = terminos[:-1], terminos[-1]
+        listas = []
+        for termino in completos:
+            postings = self.__terminos.get(termino)
+            if not postings:
+                return {}
+            listas.append(postings)
+        expansiones = self.expandir(ultimo)
+        if not expansiones:
+            return {}
+        listas.sort(key=len)
+
+        if len(expansiones) == 1:
+            #Un solo termino: el bono exacto no cambia el orden, se usa la lista tal cual
+            puntajes = self.__terminos[expansiones[0]]
+        elif not listas or sum(len(self.__terminos[t]) for t in expansiones) <= len(listas[0]) * len(expansiones):
+            puntajes = {}
+            for termino in expansiones:
+                bono = self.BONO_EXACTO if termino == ultimo else 0
+                for sku, peso in self.__terminos[termino].items():
+                    if peso + bono > puntajes.get(sku, 0):
+                        puntajes[sku] = peso + bono
+        else:
+            #La lista mas corta acota el trabajo: se verifica el prefijo solo sobre ella
+            puntajes = {}
+            postings_expansion = [(self.__terminos[t], self.BONO_EXACTO if t == ultimo else 0) for t in expansiones]
+            for sku in listas[0]:
+                mejor = 0
+                for postings, bono in postings_expansion:
+                    peso = postings.get(sku)
+                    if peso is not None and peso + bono > mejor:
+                        mejor = peso + bono
+                if mejor:
+                    puntajes[sku] = mejor
+
+        if listas:
+            #La interseccion de llaves se resuelve en C; se ordena por SKU para un resultado estable
+            comunes = puntajes.keys()
+            for postings in listas:
+                comunes = comunes & postings.keys()
+            puntajes = {sku: puntajes[sku] for sku in sorted(comunes)}
+            for postings in listas:
+                for sku in puntajes:
+                    puntajes[sku] += postings[sku]
+        return puntajes
+
+
+#Agregados de costos por grupo (categoria / almacen) con mantenimiento incremental
+
+class Acumulador:
+    __slots__ = ("parciales", "cantidad", "minimo", "maximo", "sucio")
+
+    def __init__(self):
+        #Suma exacta en parciales sin solapamiento (como math.fsum): altas y bajas en
+        #cualquier orden dan el mismo resultado que sumar de cero, sin deriva
+        self.parciales = []
+        self.cantidad = 0
+        self.minimo = None
+        self.maximo = None
+        self.sucio = False
+
+    def __sumar(self, valor):
+        parciales = self.parciales
+        i = 0
+        for parcial in parciales:
+            if abs(valor) < abs(parcial):
+                valor, parcial = parcial, valor
+            alto = valor + parcial
+            bajo = parcial - (alto - valor)
+            if bajo:
+                parciales[i] = bajo
+                i += 1
+            valor = alto
+        parciales[i:] = [valor]
+
+    @property
+    def suma(self):
+        return math.fsum(self.parciales)
+
+    def agregar(self, valor):
+        self.__sumar(valor)
+        self.cantidad += 1
+        if not self.sucio:
+            if self.minimo is None or valor < self.minimo:
+                self.minimo = valor
+            if self.maximo is None or valor > self.maximo:
+                self.maximo = valor
+
+    def quitar(self, valor):
+        self.__sumar(-valor)
+        self.cantidad -= 1
+        #Si se va un extremo, min/max se recalculan al leer
+        if valor == self.minimo or valor == self.maximo:
+            self.sucio = True
+
+    def resumen(self):
+        suma = self.suma
+        return {
+            "suma": round(suma, 2),
+            "cantidad": self.cantidad,
+            "min": self.minimo,
+            "max": self.maximo,
+            "promedio": suma / self.cantidad if self.cantidad else 0.0,
+        }
+
+class AgregadosCostos:
+    METRICAS = ("precio", "envio", "final")
+    AGRUPACIONES = ("categoria", "almacen", None)
+
+    def __init__(self):
+        #(agrupacion, grupo) -> ({metrica: Acumulador}, {sku: (precio, envio, final)})
+        self.__grupos = {}
+        self.__grupos_por_sku = {}
+
+    def agregar(self, producto):
+        sku = producto.codigo_SKU
+        desglose = producto.desglose_precio()
+        valores = (desglose.precio, desglose.envio, desglose.final)
+        claves = (("categoria", producto.categoria),
+                  ("almacen", getattr(producto, "almacen_ubicacion", None)),
+                  (None, "total"))
+        for clave in claves:
+            grupo = self.__grupos.get(clave)
+            if grupo is None:
+                grupo = self.__grupos[clave] = ({m: Acumulador() for m in self.METRICAS}, {})
+            acumuladores, miembros = grupo
+            for metrica, valor in zip(self.METRICAS, valores):
+                acumuladores[metrica].agregar(valor)
+            miembros[sku] = valores
+        self.__grupos_por_sku[sku] = claves
+
+    def quitar(self, codigo_SKU):
+        claves = self.__grupos_por_sku.pop(codigo_SKU, None)
+        if claves is None:
+            return
+        for clave in claves:
+            acumuladores, miembros = self.__grupos[clave]
+            valores = miembros.pop(codigo_SKU)
+            if not miembros:
+                del self.__grupos[clave]
+                continue
+            for metrica, valor in zip(self.METRICAS, valores):
+                acumuladores[metrica].quitar(valor)
+
+    def actualizar(self, producto):
+        self.quitar(producto.codigo_SKU)
+        self.agregar(producto)
+
+    def resultado(self, agrupar_por="categoria"):
+        if agrupar_por not in self.AGRUPACIONES:
+            raise ValueError(f"Agrupacion no soportada: {agrupar_por}")
+        resultado = {}
+        for (agrupacion, grupo), (acumuladores, miembros) in self.__grupos.items():
+            if agrupacion != agrupar_por:
+                continue
+            for i, metrica in enumerate(self.METRICAS):
+                acumulador = acumuladores[metrica]
+                if acumulador.sucio:
+                    columna = [valores[i] for valores in miembros.values()]
+                    acumulador.minimo, acumulador.maximo, acumulador.sucio = min(columna), max(columna), False
+            resultado[grupo] = {metrica: acumuladores[metrica].resumen() for metrica in self.METRICAS}
+        return resultado
+
+
+#Listados paginados: indices ordenados por clave con paginacion por cursor
+
+PaginaCatalogo = namedtuple("PaginaCatalogo", ["productos", "cursor_siguiente"])
+
+class IndiceOrdenado:
+    #Si cambia mas de esta fraccion del catalogo se reordena todo en vez de aplicar cambios uno a uno
+    FRACCION_RECONSTRUCCION = 0.05
+
+    def __init__(self, clave):
+        self.clave = clave
+        self.__entradas = []     #(valor, sku) ordenadas
+        self.__valores = {}      #sku -> valor indexado
+        self.__pendientes = set()
+        self.__construido = False
+        #marcar() llega desde los hilos que cambian stock o precio mientras otro lista
+        self.__lock = threading.Lock()
+
+    def marcar(self, codigo_SKU):
+        with self.__lock:
+            if self.__construido:
+                self.__pendientes.add(codigo_SKU)
+
+    def sincronizar(self, productos):
+        with self.__lock:
+            self.__sincronizar(productos)
+
+    def __sincronizar(self, productos):
+        if not self.__construido or len(self.__pendientes) > len(self.__entradas) * self.FRACCION_RECONSTRUCCION:
+            self.__valores = {sku: self.clave(producto) for sku, producto in productos.items()}
+            self.__entradas = sorted((valor, sku) for sku, valor in self.__valores.items())
+            self.__construido = True
+        else:
+            for sku in self.__pendientes:
+                if sku in self.__valores:
+                    i = bisect.bisect_left(self.__entradas, (self.__valores.pop(sku), sku))
+                    del self.__entradas[i]
+                producto = productos.get(sku)
+                if producto is not None:
+                    valor = self.__valores[sku] = self.clave(producto)
+                    bisect.insort(self.__entradas, (valor, sku))
+        self.__pendientes.clear()
+
+    def pagina(self, cursor, cantidad, descendente=False):
+        with self.__lock:
+            return self.__pagina(cursor, cantidad, descendente)
+
+    def __pagina(self, cursor, cantidad, descendente):
+        entradas = self.__entradas
+        if not descendente:
+            inicio = 0 if cursor is None else bisect.bisect_right(entradas, cursor)
+            seleccion = entradas[inicio:inicio + cantidad]
+        else:
+            fin = len(entradas) if cursor is None else bisect.bisect_left(entradas, cursor)
+            seleccion = entradas[max(fin - cantidad, 0):fin][::-1]
+        return seleccion
+
+
 #Catalogo y ejecucion
 
 class Catalogo:
-    def __init__(self):
-        self.productos = []
+    #Claves de orden disponibles para los listados
+    ORDENES = {
+        "precio_final": lambda producto: producto.calcular_precio_final(),
+        "stock": lambda producto: producto.stock,
+        "nombre": lambda producto: producto.nombre.lower(),
+    }
+
+    def __init__(self, columnar=False):
+        #Indice principal por SKU y secundarios por categoria y almacen (O(1))
+        self.__productos = {}
+        self.__por_categoria = {}
+        self.__por_almacen = {}
+        self.__columnas = ColumnasCatalogo() if columnar else None
+        #El indice de busqueda se construye en la primera consulta y luego se mantiene
+        self.__busqueda = None
+        #Indices ordenados para listados, creados al pedir cada orden por primera vez
+        self.__ordenes = {}
+        #Agregados incrementales, creados en la primera lectura de totales()
+        self.__agregados = None
+
+    @property
+    def productos(self):
+        return list(self.__productos.values())
+
+    def __len__(self):
+        return len(self.__productos)
+
+    def __contains__(self, codigo_SKU):
+        return codigo_SKU in self.__productos
     
     def agregar_producto(self, producto):
-        self.productos.append(producto)
+        sku = producto.codigo_SKU
+        if sku in self.__productos:
+            raise ValueError(f"Ya existe un producto con SKU {sku}")
+        self.__productos[sku] = producto
+        self.__por_categoria.setdefault(producto.categoria, {})[sku] = producto
+        almacen = getattr(producto, "almacen_ubicacion", None)
+        if almacen is not None:
+            self.__por_almacen.setdefault(almacen, {})[sku] = producto
+        if self.__columnas is not None:
+            self.__columnas.agregar(producto)
+        if self.__busqueda is not None:
+            self.__busqueda.indexar(producto)
+        for indice in self.__ordenes.values():
+            indice.marcar(sku)
+        if self.__agregados is not None:
+            self.__agregados.agregar(producto)
+        producto._suscribir(self)
+
+    def eliminar_producto(self, codigo_SKU):
+        producto = self.__productos.pop(codigo_SKU, None)
+        if producto is None:
+            raise KeyError(f"No existe un producto con SKU {codigo_SKU}")
+        self.__quitar_de_indice(self.__por_categoria, producto.categoria, codigo_SKU)
+        almacen = getattr(producto, "almacen_ubicacion", None)
+        if almacen is not None:
+            self.__quitar_de_indice(self.__por_almacen, almacen, codigo_SKU)
+        if self.__columnas is not None:
+            self.__columnas.eliminar(codigo_SKU)
+        if self.__busqueda is not None:
+            self.__busqueda.eliminar(codigo_SKU)
+        for indice in self.__ordenes.values():
+            indice.marcar(codigo_SKU)
+        if self.__agregados is not None:
+            self.__agregados.quitar(codigo_SKU)
+        producto._desuscribir(self)
+        return producto
+
+    def buscar_por_sku(self, codigo_SKU):
+        return self.__productos.get(codigo_SKU)
+
+    def buscar_por_categoria(self, categoria):
+        return list(self.__por_categoria.get(categoria, {}).values())
+
+    def buscar_por_almacen(self, almacen_ubicacion):
+        return list(self.__por_almacen.get(almacen_ubicacion, {}).values())
+
+    def actualizar_precio(self, codigo_SKU, nuevo_precio):
+        self.__obtener(codigo_SKU).precio = nuevo_precio
+
+    def actualizar_stock(self, codigo_SKU, nuevo_stock):
+        self.__obtener(codigo_SKU).stock = nuevo_stock
+
+    def __obtener(self, codigo_SKU):
+        producto = self.__productos.get(codigo_SKU)
+        if producto is None:
+            raise KeyError(f"No existe un producto con SKU {codigo_SKU}")
+        return producto
+
+    @staticmethod
+    def __quitar_de_indice(indice, clave, codigo_SKU):
+        grupo = indice.get(clave)
+        if grupo is not None:
+            grupo.pop(codigo_SKU, None)
+            if not grupo:
+                del indice[clave]
+
+    #Los productos avisan al catalogo cuando cambia un atributo indexado
+    def _producto_modificado(self, producto, campo, valor_anterior):
+        if self.__agregados is not None and campo not in ("stock", "formato", "beneficios"):
+            self.__agregados.actualizar(producto)
+        if campo == "almacen_ubicacion":
+            sku = producto.codigo_SKU
+            self.__quitar_de_indice(self.__por_almacen, valor_anterior, sku)
+            self.__por_almacen.setdefault(producto.almacen_ubicacion, {})[sku] = producto
+        elif campo in ("formato", "beneficios"):
+            if self.__busqueda is not None:
+                self.__busqueda.indexar(producto)
+        else:
+            if self.__columnas is not None:
+                self.__columnas.actualizar(producto)
+            indice = self.__ordenes.get("stock" if campo == "stock" else "precio_final")
+            if indice is not None:
+                indice.marcar(producto.codigo_SKU)
+
+    def listar(self, orden="precio_final", por_pagina=50, cursor=None, descendente=False):
+        if orden not in self.ORDENES:
+            raise ValueError(f"Orden no soportado: {orden}")
+        indice = self.__ordenes.get(orden)
+        if indice is None:
+            indice = self.__ordenes[orden] = IndiceOrdenado(self.ORDENES[orden])
+        indice.sincronizar(self.__productos)
+        entradas = indice.pagina(cursor, por_pagina, descendente)
+        siguiente = entradas[-1] if len(entradas) == por_pagina else None
+        return PaginaCatalogo([self.__productos[sku] for _, sku in entradas], siguiente)
+
+    def iterar_paginas(self, orden="precio_final", por_pagina=50, descendente=False):
+        cursor = None
+        while True:
+            pagina = self.listar(orden, por_pagina, cursor, descendente)
+            if pagina.productos:
+                yield pagina
+            if pagina.cursor_siguiente is None:
+                return
+            cursor = pagina.cursor_siguiente
+
+    @staticmethod
+    def renderizar_pagina(pagina):
+        #Solo se formatean los productos de la pagina pedida
+        return "".join(producto.mostrar_info() for producto in pagina.productos)
+
+    def buscar(self, texto, pagina=1, por_pagina=20, precio_min=None, precio_max=None, categoria=None,
+               contar_total=True):
+        if self.__busqueda is None:
+            self.__busqueda = IndiceBusqueda()
+            for producto in self.__productos.values():
+                self.__busqueda.indexar(producto)
+        puntajes = self.__busqueda.puntuar(texto)
+
+        filtrar = categoria is not None or precio_min is not None or precio_max is not None
+        inicio, fin = (pagina - 1) * por_pagina, pagina * por_pagina
+
+        productos = []
+        total = 0
+        for producto in self.__recorrer_por_puntaje(puntajes):
+            if filtrar:
+                if categoria is not None and producto.categoria != categoria:
+                    continue
+                if precio_min is not None or precio_max is not None:
+                    precio = producto.precio
+                    if (precio_min is not None and precio < precio_min) or (precio_max is not None and precio > precio_max):
+                        continue
+            if inicio <= total < fin:
+                productos.append(producto)
+            total += 1
+            #Sin filtros el total ya se conoce; con contar_total=False (typeahead) basta con llenar la pagina
+            if total >= fin and (not filtrar or not contar_total):
+                break
+        if not filtrar:
+            total = len(puntajes)
+        elif not contar_total:
+            total = None
+        return ResultadoBusqueda(total, pagina, productos)
+
+    def __recorrer_por_puntaje(self, puntajes):
+        #Pocos puntajes distintos: se recorre una vez por puntaje y normalmente se corta en el primero
+        for mejor in sorted(set(puntajes.values()), reverse=True):
+            for sku, puntaje in puntajes.items():
+                if puntaje == mejor:
+                    yield self.__productos[sku]
+
+    def calcular_precios_lote(self):
+        #Sin backend columnar se construyen las columnas al vuelo
+        columnas = self.__columnas
+        if columnas is None:
+            columnas = ColumnasCatalogo()
+            for producto in self.__productos.values():
+                columnas.agregar(producto)
+        return columnas.calcular_precios()
     
     def mostrar_catalogo(self):
         print("CATALOGO DE PRODUCTOS")
@@ -203,24 +1008,452 @@ class Catalogo:
             print(producto.mostrar_info())
             print("-" * 40)
     
-    def calcular_costos_totales(self):
-        print("RESUMEN DE COSTOS TOTALES")
-        print("-" * 40)
+    def calcular_costos_totales(self, imprimir=True):
+        if imprimir:
+            print("RESUMEN DE COSTOS TOTALES")
+            print("-" * 40)
         total_sin_envio = 0
         total_envios = 0
         total_final = 0
 
-        for producto in self.productos:
-            precio_base = producto.precio
-            costo_envio = producto.calcular_costo_envio()
-            precio_final = producto.calcular_precio_final()
+        for producto in self.__productos.values():
+            desglose = producto.desglose_precio()
+            precio_base = desglose.precio
+            costo_envio = desglose.envio
+            precio_final = desglose.final
 
             total_sin_envio += precio_base
             total_envios += costo_envio
             total_final += precio_final
 
-            print(f"{producto.nombre}: Base ${precio_base} + Envio ${costo_envio} = Total ${precio_final}")
-        
+            if imprimir:
+                print(f"{producto.nombre}: Base ${precio_base} + Envio ${costo_envio} = Total ${precio_final}")
+
+        return {"total_sin_envio": total_sin_envio, "total_envios": total_envios, "total_final": total_final}
+
+    def reporte_costos(self, agrupar_por="categoria"):
+        #Una sola pasada sobre el catalogo, sin imprimir
+        agregados = AgregadosCostos()
+        for producto in self.__productos.values():
+            agregados.agregar(producto)
+        return agregados.resultado(agrupar_por)
+
+    def totales(self, agrupar_por="categoria"):
+        #Tras la primera lectura los agregados se mantienen con cada cambio de producto
+        if self.__agregados is None:
+            self.__agregados = AgregadosCostos()
+            for producto in self.__productos.values():
+                self.__agregados.agregar(producto)
+        return self.__agregados.resultado(agrupar_por)
+
+
+#Importacion de catalogos por streaming (CSV / JSON Lines)
+
+ResultadoImportacion = namedtuple(
+    "ResultadoImportacion", ["filas", "importadas", "errores", "total_errores", "segundos", "filas_por_segundo"]
+)
+
+class ImportadorCatalogo:
+    #Columnas especificas de cada tipo (ademas de nombre, codigo_SKU, precio y stock)
+    TIPOS = {
+        "fisico": (producto_fisico, (("peso_kg", float), ("dimensiones", str), ("almacen_ubicacion", str))),
+        "digital": (producto_digital, (("tamaño_archivo_mb", float), ("formato", str), ("url_descarga", str), ("licencia", str))),
+        "servicio": (servicio, (("duracion_horas", float), ("profesional_asignado", str), ("fecha_prestacion", str))),
+        "suscripcion": (suscripcion, (("periodo", str), ("auto_renovable", "bool"), ("beneficios", "lista"))),
+    }
+
+    def __init__(self, catalogo, tamano_lote=10_000, max_errores=1_000):
+        self.catalogo = catalogo
+        self.tamano_lote = tamano_lote
+        self.max_errores = max_errores
+
+    def importar(self, ruta, formato=None):
+        if formato is None:
+            formato = "csv" if ruta.lower().endswith(".csv") else "jsonl"
+        if formato not in ("csv", "jsonl"):
+            raise ValueError(f"Formato no soportado: {formato}")
+
+        filas = importadas = total_errores = 0
+        errores = []
+        inicio = time.perf_counter()
+        with open(ruta, newline="", encoding="utf-8") as archivo:
+            if formato == "csv":
+                #El encabezado ocupa la linea 1
+                registros, decodificar = enumerate(csv.DictReader(archivo), 2), None
+            else:
+                registros, decodificar = ((n, l) for n, l in enumerate(archivo, 1) if l.strip()), json.loads
+            #Solo se mantiene en memoria un lote de filas a la vez
+            while True:
+                lote = list(islice(registros, self.tamano_lote))
+                if not lote:
+                    break
+                for numero, fila in lote:
+                    filas += 1
+                    try:
+                        if decodificar is not None:
+                            fila = decodificar(fila)
+                        self.catalogo.agregar_producto(self.crear_producto(fila))
+                        importadas += 1
+                    except (KeyError, TypeError, ValueError) as e:
+                        total_errores += 1
+                        if len(errores) < self.max_errores:
+                            errores.append((numero, f"{type(e).__name__}: {e}"))
+        segundos = time.perf_counter() - inicio
+        return ResultadoImportacion(filas, importadas, errores, total_errores, segundos,
+                                    filas / segundos if segundos else 0.0)
+
+    def crear_producto(self, fila):
+        tipo = str(fila["tipo"]).strip().lower()
+        if tipo not in self.TIPOS:
+            raise ValueError(f"Tipo de producto desconocido: {tipo}")
+        clase, columnas = self.TIPOS[tipo]
+        precio = float(fila["precio"])
+        stock = int(fila["stock"])
+        Producto._validar_precio(precio)
+        Producto._validar_stock(stock)
+        extras = [self.__convertir(fila[nombre], conversion) for nombre, conversion in columnas]
+        return clase(fila["nombre"], fila["codigo_SKU"], precio, stock, *extras)
+
+    @staticmethod
+    def __convertir(valor, conversion):
+        if conversion == "bool":
+            return valor if isinstance(valor, bool) else str(valor).strip().lower() in ("true", "1", "si", "sí")
+        if conversion == "lista":
+            #En CSV los beneficios vienen separados por "|"
+            return list(valor) if isinstance(valor, list) else [b.strip() for b in str(valor).split("|") if b.strip()]
+        return conversion(valor)
+
+
+#Reservas de inventario: descuenta stock de varios SKU de forma atomica
+
+class MotorReservas:
+    def __init__(self, catalogo, ttl_segundos=900, num_locks=64):
+        self.catalogo = catalogo
+        self.ttl_segundos = ttl_segundos
+        #Locks por franja de SKU: pedidos sobre SKU distintos no compiten entre si
+        self.__locks = [threading.Lock() for _ in range(num_locks)]
+        self.__reservas = {}
+        self.__vencimientos = []
+        self.__lock_reservas = threading.Lock()
+        self.__ids = count(1)
+
+    def disponible(self, codigo_SKU):
+        producto = self.catalogo.buscar_por_sku(codigo_SKU)
+        return producto.stock if producto is not None else 0
+
+    def reservar(self, lineas, ttl_segundos=None):
+        #lineas: {codigo_SKU: cantidad}. Descuenta todo o nada.
+        self.liberar_expiradas()
+        productos = []
+        for sku, cantidad in lineas.items():
+            if cantidad <= 0:
+                raise ValueError(f"La cantidad para {sku} debe ser positiva")
+            producto = self.catalogo.buscar_por_sku(sku)
+            if producto is None:
+                raise KeyError(f"No existe un producto con SKU {sku}")
+            productos.append((producto, cantidad))
+
+        cambios = []
+        with self.__bloquear(lineas):
+            for producto, cantidad in productos:
+                if producto.stock < cantidad:
+                    raise ValueError(
+                        f"Stock insuficiente para {producto.codigo_SKU}: disponible {producto.stock}, solicitado {cantidad}"
+                    )
+            for producto, cantidad in productos:
+                nuevo = producto.stock - cantidad
+                cambios.append((producto, producto._fijar_stock(nuevo), nuevo))
+        #Los observadores (indices del catalogo) se avisan sin retener los locks
+        self.__avisar(cambios)
+
+        id_reserva = f"RES-{next(self.__ids)}"
+        vence = time.monotonic() + (self.ttl_segundos if ttl_segundos is None else ttl_segundos)
+        with self.__lock_reservas:
+            self.__reservas[id_reserva] = (vence, dict(lineas))
+            heapq.heappush(self.__vencimientos, (vence, id_reserva))
+        return id_reserva
+
+    def confirmar(self, id_reserva):
+        #El pago se confirmo: el stock ya descontado queda definitivo si la reserva sigue vigente
+        with self.__lock_reservas:
+            reserva = self.__reservas.pop(id_reserva, None)
+        if reserva is None:
+            raise KeyError(f"La reserva {id_reserva} no existe o ya expiro")
+        vence, lineas = reserva
+        if vence <= time.monotonic():
+            self.__devolver(lineas)
+            raise KeyError(f"La reserva {id_reserva} no existe o ya expiro")
+        return lineas
+
+    def liberar(self, id_reserva):
+        with self.__lock_reservas:
+            reserva = self.__reservas.pop(id_reserva, None)
+        if reserva is None:
+            raise KeyError(f"La reserva {id_reserva} no existe o ya expiro")
+        self.__devolver(reserva[1])
+
+    def comprar(self, lineas):
+        return self.confirmar(self.reservar(lineas))
+
+    def liberar_expiradas(self):
+        ahora = time.monotonic()
+        expiradas = []
+        with self.__lock_reservas:
+            while self.__vencimientos and self.__vencimientos[0][0] <= ahora:
+                _, id_reserva = heapq.heappop(self.__vencimientos)
+                reserva = self.__reservas.pop(id_reserva, None)
+                if reserva is not None:
+                    expiradas.append(reserva[1])
+        for lineas in expiradas:
+            self.__devolver(lineas)
+        return len(expiradas)
+
+    def reservas_activas(self):
+        return len(self.__reservas)
+
+    def __devolver(self, lineas):
+        cambios = []
+        with self.__bloquear(lineas):
+            for sku, cantidad in lineas.items():
+                producto = self.catalogo.buscar_por_sku(sku)
+                if producto is not None:
+                    nuevo = producto.stock + cantidad
+                    cambios.append((producto, producto._fijar_stock(nuevo), nuevo))
+        self.__avisar(cambios)
+
+    @staticmethod
+    def __avisar(cambios):
+        for producto, anterior, nuevo in cambios:
+            producto._avisar_stock(anterior, nuevo)
+
+    def __bloquear(self, skus):
+        #Se toman en orden para evitar interbloqueos entre pedidos con SKU cruzados
+        indices = sorted({hash(sku) % len(self.__locks) for sku in skus})
+        return _LocksOrdenados([self.__locks[i] for i in indices])
+
+class _LocksOrdenados:
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+
+    def __exit__(self, *args):
+        for lock in reversed(self.locks):
+            lock.release()
+
+
+#Benchmark de busquedas indexadas
+def benchmark_indices(tamanos=(1_000, 10_000, 100_000, 1_000_000), consultas=100_000):
+    print("BENCHMARK DE BUSQUEDA POR SKU Y ALMACEN")
+    print("=" * 60)
+    print(f"{'Productos':>10} | {'SKU (ns/consulta)':>18} | {'Almacen (ns/consulta)':>22}")
+    almacenes = ["Almacen Bogota", "Almacen Medellin", "Almacen Cali"]
+    for tamano in tamanos:
+        catalogo = Catalogo()
+        for i in range(tamano):
+            catalogo.agregar_producto(
+                producto_fisico(f"Producto {i}", f"SKU-{i:07d}", 10.0, 10, 1.0, "10x10x10 cm", almacenes[i % 3])
+            )
+        skus = [f"SKU-{random.randrange(tamano):07d}" for _ in range(consultas)]
+
+        inicio = time.perf_counter()
+        for sku in skus:
+            catalogo.buscar_por_sku(sku)
+        ns_sku = (time.perf_counter() - inicio) / consultas * 1e9
+
+        #Mover un producto de almacen mantiene el indice secundario en O(1)
+        inicio = time.perf_counter()
+        for sku in skus:
+            producto = catalogo.buscar_por_sku(sku)
+            producto.almacen_ubicacion = almacenes[(almacenes.index(producto.almacen_ubicacion) + 1) % 3]
+        ns_almacen = (time.perf_counter() - inicio) / consultas * 1e9
+
+        print(f"{tamano:>10} | {ns_sku:>18.1f} | {ns_almacen:>22.1f}")
+
+#Benchmark de precios en lote: objetos vs columnas
+def benchmark_columnar(tamano=1_000_000):
+    print("BENCHMARK DE PRECIOS EN LOTE")
+    print("=" * 60)
+    catalogo = Catalogo(columnar=True)
+    for i in range(tamano):
+        if i % 2:
+            producto = producto_fisico(f"Producto {i}", f"SKU-{i:07d}", 10.0 + i % 100, 10, 1.5, "10x10x10 cm", "Almacen Cali")
+        else:
+            producto = servicio(f"Servicio {i}", f"SKU-{i:07d}", 50.0 + i % 100, 10, 2.0, "Tecnico", "2026-01-01")
+        catalogo.agregar_producto(producto)
+
+    inicio = time.perf_counter()
+    total_objetos = sum(producto.calcular_precio_final() for producto in catalogo.productos)
+    t_objetos = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    total_columnas = sum(catalogo.calcular_precios_lote()["precio_final"])
+    t_columnas = time.perf_counter() - inicio
+
+    print(f"Productos: {tamano}")
+    print(f"Por objeto: {t_objetos:.3f} s (total ${total_objetos:,.2f})")
+    print(f"Columnar:   {t_columnas:.3f} s (total ${total_columnas:,.2f})")
+
+#Benchmark de memoria: productos con __slots__ vs equivalente con __dict__
+class _ProductoConDict:
+    #Reproduce el diseño anterior: atributos en __dict__, historial y observadores en listas
+    def __init__(self, atributos):
+        for nombre, valor in atributos.items():
+            setattr(self, nombre, valor)
+        self._Producto__historial_precios = [self._Producto__precio]
+        self._observadores = []
+
+def _fabrica_con_dict(modelo):
+    atributos = {}
+    for clase in reversed(type(modelo).__mro__):
+        for nombre in clase.__dict__.get("__slots__", ()):
+            if nombre.startswith("__"):
+                nombre = f"_{clase.__name__}{nombre}"
+            atributos[nombre] = getattr(modelo, nombre)
+    #Una clase por tipo para que los __dict__ compartan llaves como en el diseño original
+    clase = type(f"{type(modelo).__name__}_con_dict", (_ProductoConDict,), {})
+    return lambda: clase(atributos)
+
+def _bytes_por_producto(fabrica, cantidad):
+    tracemalloc.start()
+    inicio = tracemalloc.get_traced_memory()[0]
+    productos = [fabrica() for _ in range(cantidad)]
+    usado = tracemalloc.get_traced_memory()[0] - inicio
+    tracemalloc.stop()
+    del productos
+    return usado / cantidad
+
+def benchmark_memoria(cantidad=1_000_000):
+    print("BENCHMARK DE MEMORIA POR PRODUCTO")
+    print("=" * 60)
+    beneficios = ["Ultra HD"]
+    fabricas = {
+        "producto_fisico": lambda: producto_fisico("Laptop", "SKU", 100.0, 10, 2.5, "40x30x5 cm", "Almacen Bogota"),
+        "producto_digital": lambda: producto_digital("Curso", "SKU", 50.0, 10, 100, "MP4", "https://descarga.com", "Vitalicia"),
+        "servicio": lambda: servicio("Consultoria", "SKU", 200.0, 5, 3.0, "Ana Garcia", "2026-01-16"),
+        "suscripcion": lambda: suscripcion("Streaming", "SKU", 15.99, 100, "mensual", True, beneficios),
+    }
+    print(f"{'Tipo':>18} | {'Con __dict__ (B)':>16} | {'Con __slots__ (B)':>17}")
+    for tipo, fabrica in fabricas.items():
+        antes = _bytes_por_producto(_fabrica_con_dict(fabrica()), cantidad)
+        despues = _bytes_por_producto(fabrica, cantidad)
+        print(f"{tipo:>18} | {antes:>16.1f} | {despues:>17.1f}")
+
+#Benchmark de importacion por streaming
+def benchmark_importacion(filas=1_000_000):
+    print("BENCHMARK DE IMPORTACION CSV")
+    print("=" * 60)
+    columnas = ["tipo", "nombre", "codigo_SKU", "precio", "stock", "peso_kg", "dimensiones", "almacen_ubicacion"]
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="", encoding="utf-8", delete=False) as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(columnas)
+        for i in range(filas):
+            #Una de cada mil filas trae precio negativo para ejercitar el reporte de errores
+            precio = -1 if i % 1000 == 0 else 10 + i % 100
+            escritor.writerow(["fisico", f"Producto {i}", f"SKU-{i:07d}", precio, 10, 1.5, "10x10x10 cm", "Almacen Cali"])
+        ruta = archivo.name
+    try:
+        resultado = ImportadorCatalogo(Catalogo()).importar(ruta)
+    finally:
+        os.remove(ruta)
+    print(f"Filas: {resultado.filas} - Importadas: {resultado.importadas} - Errores: {resultado.total_errores}")
+    print(f"Tiempo: {resultado.segundos:.2f} s ({resultado.filas_por_segundo:,.0f} filas/s)")
+    print(f"Primer error: linea {resultado.errores[0][0]} - {resultado.errores[0][1]}")
+
+#Benchmark de reservas concurrentes sobre SKU calientes
+def benchmark_reservas(hilos=8, pedidos_por_hilo=20_000, stock_inicial=50_000):
+    print("BENCHMARK DE RESERVAS CONCURRENTES")
+    print("=" * 60)
+    sumidero_anterior = Producto.sumidero
+    Producto.configurar_sumidero(SumideroNulo())
+    catalogo = Catalogo()
+    skus = [f"HOT-{i}" for i in range(4)]
+    for sku in skus:
+        catalogo.agregar_producto(producto_digital(sku, sku, 10.0, stock_inicial, 1, "PDF", "https://descarga.com", "Personal"))
+    motor = MotorReservas(catalogo)
+    vendidos = [0] * hilos
+
+    def comprar(n):
+        for i in range(pedidos_por_hilo):
+            lineas = {skus[i % 4]: 1, skus[(i + n) % 4]: 1}
+            try:
+                id_reserva = motor.reservar(lineas)
+            except ValueError:
+                continue
+            if i % 10 == 0:
+                motor.liberar(id_reserva)
+            else:
+                motor.confirmar(id_reserva)
+                vendidos[n] += sum(lineas.values())
+
+    trabajadores = [threading.Thread(target=comprar, args=(n,)) for n in range(hilos)]
+    inicio = time.perf_counter()
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    segundos = time.perf_counter() - inicio
+    Producto.configurar_sumidero(sumidero_anterior)
+
+    restante = sum(catalogo.buscar_por_sku(sku).stock for sku in skus)
+    print(f"Reservas: {hilos * pedidos_por_hilo} en {segundos:.2f} s ({hilos * pedidos_por_hilo / segundos:,.0f} reservas/s)")
+    print(f"Unidades vendidas: {sum(vendidos)} - Stock restante: {restante}")
+    print(f"Sin sobreventa: {sum(vendidos) + restante == stock_inicial * len(skus) and restante >= 0}")
+
+#Benchmark de busqueda typeahead
+def benchmark_busqueda(tamano=1_000_000, consultas=("lap", "laptop ga", "mouse inal", "monitor 24", "zz")):
+    print("BENCHMARK DE BUSQUEDA")
+    print("=" * 60)
+    tipos = ["Laptop", "Mouse", "Monitor", "Teclado", "Audifonos", "Tablet", "Camara", "Parlante"]
+    marcas = [f"Marca{i}" for i in range(200)]
+    adjetivos = ["Gaming", "Inalambrico", "Pro", "Mini", "Ultra", "Basico", "24", "Plus"]
+    catalogo = Catalogo()
+    for i in range(tamano):
+        nombre = f"{tipos[i % 8]} {adjetivos[(i // 8) % 8]} {marcas[(i // 64) % 200]} M{i}"
+        catalogo.agregar_producto(producto_fisico(nombre, f"SKU-{i:07d}", 10.0 + i % 500, 10, 1.0, "10x10x10 cm", "Almacen Cali"))
+    inicio = time.perf_counter()
+    catalogo.buscar("x")
+    print(f"Productos: {tamano} - Construccion del indice: {time.perf_counter() - inicio:.2f} s")
+    for consulta in consultas:
+        for _ in range(2):
+            inicio = time.perf_counter()
+            resultado = catalogo.buscar(consulta, por_pagina=10)
+            ms = (time.perf_counter() - inicio) * 1000
+            inicio = time.perf_counter()
+            catalogo.buscar(consulta, por_pagina=10, precio_max=300, contar_total=False)
+            ms_filtro = (time.perf_counter() - inicio) * 1000
+        print(f"{consulta!r:>14}: {resultado.total:>7} resultados en {ms:.2f} ms - con filtro de precio {ms_filtro:.2f} ms")
+
+#Benchmark de listados paginados
+def benchmark_listado(tamano=1_000_000, por_pagina=50):
+    print("BENCHMARK DE LISTADO PAGINADO")
+    print("=" * 60)
+    catalogo = Catalogo()
+    for i in range(tamano):
+        catalogo.agregar_producto(
+            producto_fisico(f"Producto {i}", f"SKU-{i:07d}", 10.0 + (i * 7919) % 5000, i % 300, 1.0, "10x10x10 cm", "Almacen Cali")
+        )
+    for orden in Catalogo.ORDENES:
+        inicio = time.perf_counter()
+        catalogo.listar(orden, por_pagina)
+        construccion = time.perf_counter() - inicio
+
+        cursor = None
+        inicio = time.perf_counter()
+        for _ in range(100):
+            pagina = catalogo.listar(orden, por_pagina, cursor)
+            catalogo.renderizar_pagina(pagina)
+            cursor = pagina.cursor_siguiente
+        ms_pagina = (time.perf_counter() - inicio) * 1000 / 100
+        print(f"{orden:>13}: indice {construccion:.2f} s - {ms_pagina:.3f} ms por pagina renderizada")
+
+    inicio = time.perf_counter()
+    catalogo.actualizar_precio("SKU-0000001", 1.0)
+    primero = catalogo.listar("precio_final", 1).productos[0]
+    print(f"Cambio de precio reflejado en {(time.perf_counter() - inicio) * 1000:.2f} ms: {primero.codigo_SKU}")
+
 def main():
     #Crear catalogo
     catalogo = Catalogo()
@@ -278,10 +1511,11 @@ def main():
     print("\n APLICANDO DESCUENTOS POLIMORFICOS")
     print("=" * 40)
 
-    catalogo.productos[0].aplicar_descuento(10) # Laptop 10% off
-    catalogo.productos[3].aplicar_descuento(20) # Curso python 20% off
-    catalogo.productos[6].aplicar_descuento(15) # Consultoria SEO 15% off
-    catalogo.productos[9].aplicar_descuento(5)  # Netflix 5% off
+    catalogo.buscar_por_sku("LAP-GAM-001").aplicar_descuento(10) # Laptop 10% off
+    catalogo.buscar_por_sku("CUR-PYT-101").aplicar_descuento(20) # Curso python 20% off
+    catalogo.buscar_por_sku("SER-SEO-201").aplicar_descuento(15) # Consultoria SEO 15% off
+    catalogo.buscar_por_sku("SUB-STR-301").aplicar_descuento(5)  # Netflix 5% off
+    Producto.sumidero.vaciar()
 
     #Calcular costos totaltes
     print("\n" + "=" * 50)
@@ -292,12 +1526,47 @@ def main():
     print("=" * 40)
 
     try:
-        catalogo.productos[0].precio = -100
+        catalogo.buscar_por_sku("LAP-GAM-001").precio = -100
     except ValueError as e:
         print(f"Error al cambiar de precio: {e}")
         
     print("\n CAMBIOS DE STOCK:")
-    catalogo.productos[1].stock = 3
+    catalogo.actualizar_stock("MOU-WIR-002", 3)
+    Producto.sumidero.vaciar()
+
+    print("\n BUSQUEDAS INDEXADAS")
+    print("=" * 40)
+    print(f"Almacen Bogota: {[p.nombre for p in catalogo.buscar_por_almacen('Almacen Bogota')]}")
+    print(f"Servicios: {[p.nombre for p in catalogo.buscar_por_categoria('Servicio')]}")
+    print(f"Busqueda 'descargas': {[p.nombre for p in catalogo.buscar('descargas').productos]}")
+    print(f"Busqueda 'cur' (< $100): {[p.nombre for p in catalogo.buscar('cur', precio_max=100).productos]}")
+
+    print("\n LISTADO PAGINADO (precio final, 5 por pagina)")
+    print("=" * 40)
+    for numero, pagina in enumerate(catalogo.iterar_paginas("precio_final", por_pagina=5), 1):
+        print(f"Pagina {numero}: {[p.nombre for p in pagina.productos]}")
+
+    print("\n TOTALES POR CATEGORIA")
+    print("=" * 40)
+    for categoria, metricas in catalogo.totales("categoria").items():
+        final = metricas["final"]
+        print(f"{categoria}: {final['cantidad']} productos - Total ${final['suma']} - Promedio ${final['promedio']:.2f}")
+
+    print("\n CACHE DE PRECIOS")
+    print("=" * 40)
+    print(Producto.estadisticas_cache())
+
+#Los eventos pendientes no se pierden al terminar el proceso
+atexit.register(lambda: Producto.sumidero.vaciar())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if "--benchmark" in sys.argv:
+        benchmark_indices()
+        benchmark_columnar()
+        benchmark_memoria()
+        benchmark_importacion()
+        benchmark_reservas()
+        benchmark_busqueda()
+        benchmark_listado()
+    else:
+        main()
\ No newline at end of file
@@ -35,20 +35,513 @@ ENTREGABLES:
 
 """
 from abc import ABC, abstractmethod
-from datetime import datetime
+from array import array
+from datetime import datetime, timedelta
 from typing import List, Dict
+import bisect
+import csv
+import io
+import json
+import multiprocessing
+import os
+import random
+import shelve
+import statistics
+import string
+import tempfile
+import sys
+import threading
+import time
+import tracemalloc
+from itertools import count
+from types import MappingProxyType
+
+#Historial compacto de compras: columnas tipadas y agregados en O(1)
+
+class HistorialCompras:
+    __slots__ = ("maximo_detalle", "__fechas", "__montos", "__productos", "__extras", "__descartadas",
+                 "__listas", "__listas_por_id",
+                 "gasto_total", "cantidad", "ultima_fecha", "__inicio_ventana", "__gasto_ventana")
+    VENTANA_RECIENTE = timedelta(days=90)
+
+    def __init__(self, maximo_detalle=None):
+        #maximo_detalle: cuantas compras se guardan con detalle (None = todas)
+        self.maximo_detalle = maximo_detalle
+        self.__fechas = array("d")
+        self.__montos = array("d")
+        self.__productos = array("l")
+        self.__extras = {}
+        self.__descartadas = 0
+        #Listas de productos distintas de este historial (se crean con la primera compra
+        #y se podan al compactar, asi maximo_detalle acota tambien esta tabla)
+        self.__listas = None
+        self.__listas_por_id = None
+        #Agregados acumulados (incluyen las compras ya descartadas del detalle)
+        self.gasto_total = 0.0
+        self.cantidad = 0
+        self.ultima_fecha = None
+        self.__inicio_ventana = 0
+        self.__gasto_ventana = 0.0
+
+    def agregar(self, compra, fecha=None):
+        fecha = fecha or datetime.now()
+        monto = float(compra.get("monto", 0.0))
+        id_lista = self.__id_lista(compra.get("productos", ()))
+        if self.ultima_fecha is None or fecha >= self.ultima_fecha:
+            i = len(self.__montos)
+            self.__fechas.append(fecha.timestamp())
+            self.__montos.append(monto)
+            self.__productos.append(id_lista)
+            self.ultima_fecha = fecha
+        else:
+            #Compra atrasada (por ejemplo, una importacion): se inserta en orden
+            i = bisect.bisect_right(self.__fechas, fecha.timestamp())
+            self.__fechas.insert(i, fecha.timestamp())
+            self.__montos.insert(i, monto)
+            self.__productos.insert(i, id_lista)
+            if self.__extras:
+                desde = self.__descartadas + i
+                self.__extras = {(k + 1 if k >= desde else k): v for k, v in self.__extras.items()}
+        extras = {k: v for k, v in compra.items() if k not in ("monto", "productos")}
+        if extras:
+            self.__extras[self.__descartadas + i] = extras
+        self.gasto_total += monto
+        self.cantidad += 1
+        if i < self.__inicio_ventana:
+            #Es anterior a compras que ya salieron de la ventana: tambien queda fuera
+            self.__inicio_ventana += 1
+        else:
+            self.__gasto_ventana += monto
+        if self.maximo_detalle is not None and len(self.__montos) > self.maximo_detalle * 1.25:
+            self.__compactar()
+
+    def gasto_reciente(self, ahora=None):
+        #La ventana avanza sobre las fechas ordenadas: costo amortizado O(1).
+        #Por eso "ahora" no debe retroceder entre llamadas.
+        limite = ((ahora or datetime.now()) - self.VENTANA_RECIENTE).timestamp()
+        fechas, montos = self.__fechas, self.__montos
+        while self.__inicio_ventana < len(fechas) and fechas[self.__inicio_ventana] < limite:
+            self.__gasto_ventana -= montos[self.__inicio_ventana]
+            self.__inicio_ventana += 1
+        return max(self.__gasto_ventana, 0.0)
+
+    def resumen(self):
+        #Agregados y compras de la ventana reciente, sin el detalle completo
+        if not self.cantidad:
+            return None
+        limite = (self.ultima_fecha - self.VENTANA_RECIENTE).timestamp()
+        inicio = bisect.bisect_left(self.__fechas, limite)
+        return ResumenHistorial(self.gasto_total, self.cantidad, self.ultima_fecha,
+                                self.__fechas[inicio:], self.__montos[inicio:])
+
+    def iterar(self, desde=None, hasta=None):
+        #Recorre solo el rango pedido, sin copiar el historial
+        inicio = 0 if desde is None else bisect.bisect_left(self.__fechas, desde.timestamp())
+        fin = len(self.__fechas) if hasta is None else bisect.bisect_right(self.__fechas, hasta.timestamp())
+        for i in range(inicio, fin):
+            yield self[i]
+
+    def __len__(self):
+        return len(self.__montos)
+
+    def __iter__(self):
+        return self.iterar()
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.__montos)
+        if not 0 <= i < len(self.__montos):
+            raise IndexError("Compra fuera de rango")
+        return {
+            "monto": self.__montos[i],
+            "productos": list(self.__listas_por_id[self.__productos[i]]),
+            **self.__extras.get(self.__descartadas + i, {}),
+            "Fecha": datetime.fromtimestamp(self.__fechas[i]),
+        }
+
+    def __compactar(self):
+        #Se descartan las compras mas antiguas; los agregados ya las incluyen.
+        #Las compras dentro de la ventana de 90 dias se conservan siempre.
+        self.gasto_reciente(self.ultima_fecha)
+        sobrante = min(len(self.__montos) - self.maximo_detalle, self.__inicio_ventana)
+        if sobrante <= 0:
+            return
+        del self.__fechas[:sobrante]
+        del self.__montos[:sobrante]
+        del self.__productos[:sobrante]
+        for i in range(self.__descartadas, self.__descartadas + sobrante):
+            self.__extras.pop(i, None)
+        self.__descartadas += sobrante
+        self.__inicio_ventana -= sobrante
+        #Las listas que solo usaban las compras descartadas se liberan y se renumera
+        usadas = {}
+        anteriores, productos = self.__listas_por_id, self.__productos
+        for i, id_lista in enumerate(productos):
+            nuevo = usadas.get(id_lista)
+            if nuevo is None:
+                nuevo = usadas[id_lista] = len(usadas)
+            productos[i] = nuevo
+        self.__listas_por_id = [anteriores[id_lista] for id_lista in usadas]
+        self.__listas = {clave: i for i, clave in enumerate(self.__listas_por_id)}
+
+    def __id_lista(self, productos):
+        clave = tuple(sys.intern(str(p)) for p in productos)
+        if self.__listas is None:
+            self.__listas, self.__listas_por_id = {}, []
+        id_lista = self.__listas.get(clave)
+        if id_lista is None:
+            id_lista = self.__listas[clave] = len(self.__listas_por_id)
+            self.__listas_por_id.append(clave)
+        return id_lista
+
+class ResumenHistorial:
+    #Lo que queda en memoria del historial de un cliente descargado: responde las
+    #mismas consultas de agregados que HistorialCompras sin leer el almacen
+    __slots__ = ("gasto_total", "cantidad", "ultima_fecha", "__fechas", "__montos")
+    VENTANA_RECIENTE = HistorialCompras.VENTANA_RECIENTE
+
+    def __init__(self, gasto_total, cantidad, ultima_fecha, fechas, montos):
+        self.gasto_total = gasto_total
+        self.cantidad = cantidad
+        self.ultima_fecha = ultima_fecha
+        #Solo las compras de los 90 dias previos a la ultima: "ahora" nunca es anterior
+        self.__fechas = fechas
+        self.__montos = montos
+
+    def gasto_reciente(self, ahora=None):
+        limite = ((ahora or datetime.now()) - self.VENTANA_RECIENTE).timestamp()
+        return sum(monto for fecha, monto in zip(self.__fechas, self.__montos) if fecha >= limite)
+
+_SIN_COMPRAS = ResumenHistorial(0.0, 0, None, (), ())
+
+#Plantillas de factura: se analizan una vez por clase y se renderizan con format_map
+
+class PlantillaFactura:
+    def __init__(self, texto):
+        self.texto = texto
+        #Campos que usa el texto (sin atributos ni indices, p. ej. "a.b" -> "a")
+        self.campos = frozenset(campo.split(".")[0].split("[")[0]
+                                for _, campo, _, _ in string.Formatter().parse(texto) if campo)
+        #La primera factura se valida contra datos_factura; despues se usa format_map directo
+        self.renderizar = self.__renderizar_validando
+
+    def validar(self, datos):
+        faltantes = self.campos.difference(datos)
+        if faltantes:
+            raise KeyError(f"La plantilla usa campos que los datos no entregan: {', '.join(sorted(faltantes))}")
+
+    def __renderizar_validando(self, datos):
+        self.validar(datos)
+        self.renderizar = self.texto.format_map
+        return self.renderizar(datos)
+
+    def escribir(self, destino, datos):
+        destino.write(self.renderizar(datos))
+
+class RenderizadorFacturas:
+    def __init__(self):
+        self.__buffer = io.StringIO()
+
+    def renderizar_lote(self, pares, formato="texto"):
+        #pares: iterable de (cliente, compra); el buffer se reutiliza entre lotes
+        self.__buffer.seek(0)
+        self.__buffer.truncate()
+        self.escribir_lote(pares, self.__buffer, formato)
+        return self.__buffer.getvalue()
+
+    def escribir_lote(self, pares, destino, formato="texto"):
+        cantidad = 0
+        for cliente, compra in pares:
+            datos = cliente.datos_factura(compra)
+            if formato == "texto":
+                cliente.PLANTILLA_FACTURA.escribir(destino, datos)
+            elif formato == "json":
+                destino.write(json.dumps(datos, ensure_ascii=False) + "\n")
+            else:
+                raise ValueError(f"Formato no soportado: {formato}")
+            cantidad += 1
+        return cantidad
+
+    @staticmethod
+    def estructurar_lote(pares):
+        return [cliente.datos_factura(compra) for cliente, compra in pares]
+
+#Libro de puntos: asientos solo de agregado, idempotentes por (cliente, id de compra)
+
+class LibroPuntos:
+    #Umbrales de saldo para subir de nivel; nunca se baja de nivel
+    NIVELES = (("bronce", 0), ("plata", 1_000), ("oro", 5_000))
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta
+        #cliente -> {id_compra: puntos}: sirve para la idempotencia y para los movimientos.
+        #Crece con cada compra (hay que recordar los ids ya asentados); el archivo es el
+        #registro completo y reproducir() lo reconstruye
+        self.__asientos = {}
+        self.__cantidad = 0
+        self.__saldos = {}
+        self.__archivo = None
+        self.__escritor = None
+
+    @staticmethod
+    def clave(cliente):
+        return cliente.get_email().strip().lower()
+
+    @classmethod
+    def nivel_para(cls, saldo, nivel_actual="bronce"):
+        nivel = nivel_actual
+        alcanzado = False
+        for nombre, umbral in cls.NIVELES:
+            #Solo se sube: niveles por encima del actual cuyo umbral ya se alcanzo
+            if alcanzado and saldo >= umbral:
+                nivel = nombre
+            alcanzado = alcanzado or nombre == nivel_actual
+        return nivel
+
+    def registrar(self, cliente, id_compra, monto):
+        #Devuelve los puntos asentados, o 0 si la compra ya estaba registrada
+        clave = self.clave(cliente)
+        id_compra = str(id_compra)
+        if id_compra in self.__asientos.get(clave, ()):
+            return 0
+        puntos = cliente.puntos_por_compra(monto)
+        self.__asentar(clave, id_compra, puntos)
+        if self.ruta is not None:
+            if self.__archivo is None:
+                #csv escapa tabuladores y saltos de linea dentro de emails o ids
+                self.__archivo = open(self.ruta, "a", encoding="utf-8", newline="")
+                self.__escritor = csv.writer(self.__archivo, delimiter="\t", lineterminator="\n")
+            self.__escritor.writerow((clave, id_compra, puntos))
+        self.__aplicar(cliente, self.__saldos[clave])
+        return puntos
+
+    def __asentar(self, clave, id_compra, puntos):
+        asientos = self.__asientos.get(clave)
+        if asientos is None:
+            asientos = self.__asientos[clave] = {}
+        asientos[id_compra] = puntos
+        self.__cantidad += 1
+        self.__saldos[clave] = self.__saldos.get(clave, 0) + puntos
+
+    def __aplicar(self, cliente, saldo):
+        cliente.puntos_acumulados = saldo
+        cliente.nivel = self.nivel_para(saldo, cliente.nivel)
+
+    def saldo(self, cliente):
+        return self.__saldos.get(self.clave(cliente), 0)
+
+    def movimientos(self, cliente):
+        return list(self.__asientos.get(self.clave(cliente), {}).items())
+
+    def vaciar(self):
+        if self.__archivo is not None:
+            self.__archivo.flush()
+
+    def cerrar(self):
+        if self.__archivo is not None:
+            self.__archivo.close()
+            self.__archivo = self.__escritor = None
+
+    def reproducir(self, clientes=()):
+        #Reconstruye saldos desde el archivo (p. ej. tras un reinicio) y los aplica a clientes
+        self.cerrar()
+        self.__asientos.clear()
+        self.__saldos.clear()
+        self.__cantidad = 0
+        if self.ruta is not None and os.path.exists(self.ruta):
+            #Bucle con locales: es el camino caliente al arrancar con muchos clientes
+            asientos, saldos, cantidad = self.__asientos, self.__saldos, 0
+            with open(self.ruta, encoding="utf-8", newline="") as archivo:
+                for clave, id_compra, puntos in csv.reader(archivo, delimiter="\t"):
+                    del_cliente = asientos.get(clave)
+                    if del_cliente is None:
+                        del_cliente = asientos[clave] = {}
+                    elif id_compra in del_cliente:
+                        continue
+                    puntos = del_cliente[id_compra] = int(puntos)
+                    saldos[clave] = saldos.get(clave, 0) + puntos
+                    cantidad += 1
+            self.__cantidad = cantidad
+        saldos = self.__saldos
+        for cliente in clientes:
+            if isinstance(cliente, ClienteRegular):
+                self.__aplicar(cliente, saldos.get(self.clave(cliente), 0))
+        return self.__cantidad
+
+    def __len__(self):
+        return self.__cantidad
+
+#Red de referidos: afiliado -> clientes referidos, con comisiones acumuladas por mes
+
+class RedReferidos:
+    def __init__(self):
+        self.__referente = {}
+        #afiliado -> {cliente: None}; dict para conservar orden y borrar en O(1)
+        self.__referidos = {}
+        self.__comision_total = {}
+        self.__por_afiliado = {}
+        self.__por_mes = {}
+
+    def vincular(self, afiliado, cliente):
+        if cliente is afiliado:
+            raise ValueError("Un afiliado no puede referirse a si mismo")
+        if cliente in self.__referente:
+            raise ValueError(f"{cliente.get_nombre()} ya fue referido por {self.__referente[cliente].codigo_afiliado}")
+        self.__referente[cliente] = afiliado
+        referidos = self.__referidos.setdefault(afiliado, {})
+        referidos[cliente] = None
+        afiliado.referidos = len(referidos)
+
+    def desvincular(self, cliente):
+        #Las comisiones ya acumuladas se conservan
+        afiliado = self.__referente.pop(cliente, None)
+        if afiliado is not None:
+            referidos = self.__referidos[afiliado]
+            del referidos[cliente]
+            afiliado.referidos = len(referidos)
+        return afiliado
+
+    def referente(self, cliente):
+        return self.__referente.get(cliente)
+
+    def referidos(self, afiliado):
+        return list(self.__referidos.get(afiliado, ()))
+
+    def registrar_compra(self, cliente, monto, fecha):
+        #Solo cuentan las compras hechas despues de vincular al cliente
+        afiliado = self.__referente.get(cliente)
+        if afiliado is None:
+            return 0.0
+        comision = monto * afiliado.comision_porcentaje
+        periodo = (fecha.year, fecha.month)
+        self.__comision_total[afiliado] = self.__comision_total.get(afiliado, 0.0) + comision
+        meses = self.__por_afiliado.setdefault(afiliado, {})
+        meses[periodo] = meses.get(periodo, 0.0) + comision
+        afiliados = self.__por_mes.setdefault(periodo, {})
+        afiliados[afiliado] = afiliados.get(afiliado, 0.0) + comision
+        return comision
+
+    def comision_total(self, afiliado):
+        return self.__comision_total.get(afiliado, 0.0)
+
+    def comision_mensual(self, afiliado, anio, mes):
+        return self.__por_afiliado.get(afiliado, {}).get((anio, mes), 0.0)
+
+    def historial_comisiones(self, afiliado):
+        return sorted(self.__por_afiliado.get(afiliado, {}).items())
+
+    def resumen_mensual(self, anio, mes):
+        #{codigo_afiliado: comision} sin recorrer historiales de clientes
+        return {afiliado.codigo_afiliado: comision for afiliado, comision in self.__por_mes.get((anio, mes), {}).items()}
+
+#Linea de credito: exposicion reservada por pedidos abiertos, con un lock por cuenta
+
+class LineaCredito:
+    __slots__ = ("limite", "__lock", "__expuesto", "__reservas", "pagado", "cancelado")
+    #Ids unicos entre todas las lineas; next() sobre count no necesita lock
+    _ids = count(1)
+
+    def __init__(self, limite):
+        self.limite = limite
+        self.__lock = threading.Lock()
+        self.__expuesto = 0.0
+        self.__reservas = {}
+        self.pagado = 0.0
+        self.cancelado = 0.0
+
+    @property
+    def expuesto(self):
+        return self.__expuesto
+
+    @property
+    def disponible(self):
+        return self.limite - self.__expuesto
+
+    def reservar(self, monto):
+        #Reserva credito para un pedido; todo o nada
+        if monto <= 0:
+            raise ValueError("El monto a reservar debe ser positivo")
+        id_reserva = f"CRED-{next(self._ids)}"
+        #Seccion critica minima: solo comparar y sumar
+        with self.__lock:
+            if self.__expuesto + monto > self.limite:
+                raise ValueError(
+                    f"Credito insuficiente: disponible {self.limite - self.__expuesto:.2f}, solicitado {monto:.2f}"
+                )
+            self.__expuesto += monto
+            self.__reservas[id_reserva] = monto
+        return id_reserva
+
+    def __soltar(self, id_reserva, pagada):
+        with self.__lock:
+            monto = self.__reservas.pop(id_reserva, None)
+            if monto is not None:
+                self.__expuesto -= monto
+                if pagada:
+                    self.pagado += monto
+                else:
+                    self.cancelado += monto
+        if monto is None:
+            raise KeyError(f"La reserva de credito {id_reserva} no existe o ya se cerro")
+        return monto
+
+    def pagar(self, id_reserva):
+        return self.__soltar(id_reserva, True)
+
+    def cancelar(self, id_reserva):
+        return self.__soltar(id_reserva, False)
+
+    def reservas_abiertas(self):
+        with self.__lock:
+            return dict(self.__reservas)
+
+#Almacen de respaldo para los datos poco usados de cada cliente
+
+_PENDIENTE = object()
+
+class AlmacenClientes:
+    def __init__(self, ruta):
+        #shelve en disco: lo descargado deja de ocupar memoria del proceso
+        self.ruta = ruta
+        self.__datos = shelve.open(ruta)
+
+    @staticmethod
+    def clave(cliente):
+        #Identidad del objeto: el email puede repetirse o cambiar. Si un cliente
+        #descargado se destruye, el siguiente que reciba su id reemplaza el registro
+        return format(id(cliente), "x")
+
+    def descargar(self, cliente):
+        #Guarda telefono, fecha de registro e historial y los libera del objeto
+        self.__datos[self.clave(cliente)] = cliente._exportar_perezosos()
+        cliente._marcar_pendiente(self)
+
+    def cargar(self, cliente):
+        return self.__datos.pop(self.clave(cliente))
+
+    def __len__(self):
+        return len(self.__datos)
+
+    def cerrar(self):
+        self.__datos.close()
 
 #Abstraccion
 
 class Cliente(ABC):
+    __slots__ = ("__nombre", "__email", "__telefono", "__fecha_registro", "__historial", "_almacen")
+
+    #Red compartida por todos los clientes; se puede reemplazar en la clase
+    red_referidos = RedReferidos()
+
     def __init__(self, nombre, email, telefono):
         #Encapsulamiento: atributos privados
         self.__nombre = nombre
         self.__email = email
         self.__telefono = telefono
         self.__fecha_registro = datetime.now()
-        #Encapsulamiento: atributo protegido
-        self._historial_compras = []
+        #Encapsulamiento: el historial se crea con la primera compra
+        self.__historial = None
+        self._almacen = None
 
     #Encapsulamiento
     def get_nombre(self):
@@ -56,18 +549,67 @@ class Cliente(ABC):
     
     def get_email(self):
         return self.__email
+
+    def get_telefono(self):
+        if self._almacen is not None:
+            self._cargar_perezosos()
+        return self.__telefono
         
     def get_fecha_registro(self):
+        if self._almacen is not None:
+            self._cargar_perezosos()
         return self.__fecha_registro
 
-    def agregar_compra(self, compra):
-        self._historial_compras.append({
-            **compra,
-            "Fecha" : datetime.now()
-        })
+    #Encapsulamiento: atributo protegido
+    @property
+    def _historial_compras(self):
+        if self._almacen is not None:
+            self._cargar_perezosos()
+        if self.__historial is None:
+            self.__historial = HistorialCompras()
+        return self.__historial
+
+    def _resumen_historial(self):
+        #Agregados de compras sin cargar un historial descargado
+        return self.__historial if self.__historial is not None else _SIN_COMPRAS
+
+    def _cargar_perezosos(self):
+        datos = self._almacen.cargar(self)
+        self._almacen = None
+        self._importar_perezosos(datos)
+
+    #Cada subclase agrega sus propios campos perezosos a estos tres metodos
+    def _exportar_perezosos(self):
+        return {"telefono": self.get_telefono(), "fecha_registro": self.get_fecha_registro(), "historial": self.__historial}
+
+    def _importar_perezosos(self, datos):
+        self.__telefono = datos["telefono"]
+        self.__fecha_registro = datos["fecha_registro"]
+        self.__historial = datos["historial"]
+
+    def _marcar_pendiente(self, almacen):
+        self.__telefono = self.__fecha_registro = _PENDIENTE
+        self.__historial = None if self.__historial is None else self.__historial.resumen()
+        self._almacen = almacen
+
+    def agregar_compra(self, compra, fecha=None):
+        self._historial_compras.agregar(compra, fecha)
+        self.red_referidos.registrar_compra(self, float(compra.get("monto", 0.0)), self._historial_compras.ultima_fecha)
     
     def obtener_historial(self):
-        return self._historial_compras.copy()
+        return list(self._historial_compras)
+
+    def iterar_historial(self, desde=None, hasta=None):
+        return self._historial_compras.iterar(desde, hasta)
+
+    def obtener_estadisticas(self):
+        historial = self._resumen_historial()
+        return {
+            "gasto_total": historial.gasto_total,
+            "cantidad_compras": historial.cantidad,
+            "gasto_ultimos_90_dias": historial.gasto_reciente(),
+            "ultima_compra": historial.ultima_fecha,
+        }
     
     #Abstraccion
     @abstractmethod
@@ -79,12 +621,48 @@ class Cliente(ABC):
         pass
 
     @abstractmethod
-    def generar_factura(self, compra):
+    def datos_factura(self, compra):
         pass
+
+    def uso_beneficios(self):
+        #Medida numerica del beneficio aprovechado; cada tipo define la suya
+        return 0.0
+
+    #Cada tipo define su PLANTILLA_FACTURA; el texto se genera a partir de datos_factura
+    PLANTILLA_FACTURA = None
+
+    def generar_factura(self, compra):
+        return self.PLANTILLA_FACTURA.renderizar(self.datos_factura(compra))
     
 #Herencia
 
 class ClienteRegular(Cliente):
+    __slots__ = ("puntos_acumulados", "nivel")
+    #Libro compartido por todos los clientes regulares; se puede reemplazar (p. ej. con ruta)
+    libro_puntos = LibroPuntos()
+
+    #Politica (ver cargar_politicas): compartida e inmutable entre instancias
+    DESCUENTO_NIVEL = MappingProxyType({"bronce": 0.02, "plata": 0.05, "oro": 0.08})
+    MULTIPLICADOR_PUNTOS = MappingProxyType({"bronce": 1, "plata": 2, "oro": 3})
+    TASA_PUNTOS = 0.1
+    DESCUENTO_POR_PUNTO = 0.001
+    DESCUENTO_PUNTOS_MAX = 0.05
+    BENEFICIOS = (
+        "Acumulacion de puntos por compras",
+        "Descuentos progresivos segun nivel",
+        "Ofertas exclusivas por email",
+    )
+    BENEFICIOS_NIVEL = MappingProxyType({
+        "plata": ("Atencion prioritaria",),
+        "oro": ("Atencion prioritaria", "Acceso a eventos exclusivos"),
+    })
+
+    @classmethod
+    def _precalcular(cls):
+        cls.BENEFICIOS_POR_NIVEL = MappingProxyType({
+            nivel: cls.BENEFICIOS + cls.BENEFICIOS_NIVEL.get(nivel, ()) for nivel in cls.DESCUENTO_NIVEL
+        })
+
     def __init__(self, nombre, email, telefono, nivel: str = "bronce"):
         super().__init__(nombre, email, telefono)
         self.puntos_acumulados = 0
@@ -92,186 +670,878 @@ class ClienteRegular(Cliente):
     
     #Encapsulamiento
     def __calcular_puntos(self, monto):
-        multiplicadores = {"bronce": 1, "plata": 2, "oro": 3}
-        return int(monto * 0.1) * multiplicadores.get(self.nivel, 1)
+        multiplicadores = self.MULTIPLICADOR_PUNTOS
+        return int(monto * self.TASA_PUNTOS) * multiplicadores.get(self.nivel, multiplicadores["bronce"])
+
+    def puntos_por_compra(self, monto):
+        return self.__calcular_puntos(monto)
+
+    def agregar_compra(self, compra, fecha=None):
+        super().agregar_compra(compra, fecha)
+        #Sin "id" se usa el numero de compra del cliente
+        id_compra = compra.get("id", f"#{self._historial_compras.cantidad}")
+        self.libro_puntos.registrar(self, id_compra, compra["monto"])
     
     def calcular_descuento(self, monto):
         #Polimorfismo
-        descuento_nivel = {"bronce": 0.02, "plata": 0.05, "oro": 0.08}
-        descuento_base = descuento_nivel.get(self.nivel, 0.02)
-        descuento_puntos = min(self.puntos_acumulados * 0.001, 0.05)
+        descuento_nivel = self.DESCUENTO_NIVEL
+        descuento_base = descuento_nivel.get(self.nivel, descuento_nivel["bronce"])
+        descuento_puntos = min(self.puntos_acumulados * self.DESCUENTO_POR_PUNTO, self.DESCUENTO_PUNTOS_MAX)
 
         return monto * (descuento_base + descuento_puntos)
     
     def obtener_beneficios(self):
-        #Polimorfismo
-        beneficios = [
-            "Acumulacion de puntos por compras"
-            "Descuentos progresivos segun nivel"
-            "Ofertas exclusivas por email"
-        ]
+        #Polimorfismo: tupla compartida, precalculada por nivel
+        return self.BENEFICIOS_POR_NIVEL.get(self.nivel, self.BENEFICIOS)
 
-        if self.nivel == "plata":
-            beneficios.append("Atencion prioritaria")
-        elif self.nivel == "oro":
-            beneficios.extend(["Atencion prioritaria", "Acceso a eventos exclusivos"])
-        
-        return beneficios
+    def uso_beneficios(self):
+        return float(self.puntos_acumulados)
     
-    def generar_factura(self, compra):
-        descuento = self.calcular_descuento(compra["monto"])
-        self.puntos_acumulados += self.__calcular_puntos(compra["monto"])
-        return f"""
+    PLANTILLA_FACTURA = PlantillaFactura("""
         FACTURA CLIENTE REGULAR
         =======================
-        Cliente: {self.get_nombre()}
-        Nivel: {self.nivel}
-        Puntos acumulados: {self.puntos_acumulados}
-        Subtotal: ${compra["monto"]:.2f}
+        Cliente: {cliente}
+        Nivel: {nivel}
+        Puntos acumulados: {puntos_acumulados}
+        Subtotal: ${subtotal:.2f}
         Descunto: ${descuento:.2f}
-        Total: ${compra["monto"] - descuento:.2f}
+        Total: ${total:.2f}
         ========================
-        """
+        """)
+
+    def datos_factura(self, compra):
+        #Los puntos se asientan en agregar_compra; la factura solo los muestra
+        descuento = self.calcular_descuento(compra["monto"])
+        return {
+            "tipo": "regular",
+            "cliente": self.get_nombre(),
+            "nivel": self.nivel,
+            "puntos_acumulados": self.puntos_acumulados,
+            "subtotal": compra["monto"],
+            "descuento": descuento,
+            "total": compra["monto"] - descuento,
+        }
     
 #Herencia
 class ClientePremium(Cliente):
+    __slots__ = ("__fecha_inicio_membresia", "cuota_mensual", "envio_gratis")
+    DESCUENTO = 0.10
+    BENEFICIOS = (
+        "10 % de descuento en todas las compras",
+        "Envio gratis ilimiado",
+        "Acceso prioritario a nuevos productos",
+        "Soporte VIP 24/7",
+        "Devoluciones sin costo",
+    )
+
     def __init__(self, nombre, email, telefono, cuota_mensual):
         super().__init__(nombre, email, telefono)
-        self.fecha_inicio_membresia = datetime.now()
+        self.__fecha_inicio_membresia = datetime.now()
         self.cuota_mensual = cuota_mensual
         self.envio_gratis = True
+
+    #Se descarga junto con los demas datos poco usados (ver AlmacenClientes)
+    @property
+    def fecha_inicio_membresia(self):
+        if self._almacen is not None:
+            self._cargar_perezosos()
+        return self.__fecha_inicio_membresia
+
+    @fecha_inicio_membresia.setter
+    def fecha_inicio_membresia(self, fecha):
+        if self._almacen is not None:
+            self._cargar_perezosos()
+        self.__fecha_inicio_membresia = fecha
+
+    def _exportar_perezosos(self):
+        datos = super()._exportar_perezosos()
+        datos["fecha_inicio_membresia"] = self.fecha_inicio_membresia
+        return datos
+
+    def _importar_perezosos(self, datos):
+        super()._importar_perezosos(datos)
+        self.__fecha_inicio_membresia = datos["fecha_inicio_membresia"]
+
+    def _marcar_pendiente(self, almacen):
+        super()._marcar_pendiente(almacen)
+        self.__fecha_inicio_membresia = _PENDIENTE
     
     #Polimorfismo
     def calcular_descuento(self, monto):
         #polimorfismo
-        return monto * 0.10
+        return monto * self.DESCUENTO
     
     def obtener_beneficios(self):
         #polimorfismo
-        return [
-            "10 % de descuento en todas las compras",
-            "Envio gratis ilimiado",
-            "Acceso prioritario a nuevos productos",
-            "Soporte VIP 24/7",
-            "Devoluciones sin costo"
-        ]
+        return self.BENEFICIOS
+
+    def uso_beneficios(self):
+        #Envios gratis aprovechados
+        return float(self._resumen_historial().cantidad)
     
-    def generar_factura(self, compra):
-        descuento = self.calcular_descuento(compra["monto"])
-        return f"""
+    PLANTILLA_FACTURA = PlantillaFactura("""
         ⭐FACTURA CLIENTE PREMIUM⭐
         ============================
-        Cliente: {self.get_nombre()}
-        Membresia desde: {self.fecha_inicio_membresia.strftime("%d/%m/%Y")}
-        Cuota mensual: ${self.cuota_mensual:.2f}
+        Cliente: {cliente}
+        Membresia desde: {membresia_desde}
+        Cuota mensual: ${cuota_mensual:.2f}
         -----------------------
-        Subtotal: ${compra["monto"]:.2f}
+        Subtotal: ${subtotal:.2f}
         Descuento Premium (10%): ${descuento:.2f}
         Envio: Gratis
-        Total: ${compra["monto"] - descuento:.2f}
+        Total: ${total:.2f}
         =============================
         Gracias por se Premium!🌟
-        """
+        """)
+
+    def datos_factura(self, compra):
+        descuento = self.calcular_descuento(compra["monto"])
+        return {
+            "tipo": "premium",
+            "cliente": self.get_nombre(),
+            "membresia_desde": self.fecha_inicio_membresia.strftime("%d/%m/%Y"),
+            "cuota_mensual": self.cuota_mensual,
+            "subtotal": compra["monto"],
+            "descuento": descuento,
+            "total": compra["monto"] - descuento,
+        }
 
 #Herencia
 class ClienteCorporativo(Cliente):
+    __slots__ = ("empresa", "__ruc", "__limite", "__credito", "descuento_volumen")
+    #Solo protege la creacion perezosa de la linea de credito
+    _lock_credito = threading.Lock()
+    DESCUENTO_VOLUMEN = 0.15
+    LIMITE_CREDITO = 10000.0
+    #(umbral, recargo) de mayor a menor: se aplica el primero que supere el monto
+    RECARGOS_VOLUMEN = ((5000, 0.05), (2000, 0.02))
+    BENEFICIOS = (
+        "Descuentos por volumen de compra",
+        "Linea de credito corporativa",
+        "Facturacion consolidada",
+        "Account manager dedicado",
+        "Pedidos prioritarios",
+    )
+
     def __init__(self, nombre, email, telefono, empresa, ruc):
         super().__init__(nombre, email, telefono)
         self.empresa = empresa
         self.__ruc = ruc
-        self.limite_credito = 10000.0
-        self.descuento_volumen = 0.15
+        self.__limite = self.LIMITE_CREDITO
+        #La linea (lock y reservas) se crea con el primer pedido a credito
+        self.__credito = None
+        self.descuento_volumen = self.DESCUENTO_VOLUMEN
     
     #Encapsulamiento
     def get_ruc(self):
         return self.__ruc
+
+    @property
+    def credito(self):
+        if self.__credito is None:
+            with self._lock_credito:
+                if self.__credito is None:
+                    self.__credito = LineaCredito(self.__limite)
+        return self.__credito
+
+    @property
+    def limite_credito(self):
+        return self.__limite if self.__credito is None else self.__credito.limite
+
+    @limite_credito.setter
+    def limite_credito(self, valor):
+        #Bajar el limite no cancela reservas abiertas, solo bloquea las nuevas
+        self.__limite = valor
+        if self.__credito is not None:
+            self.__credito.limite = valor
     
     #Polimorfismo
     def calcular_descuento(self, monto):
-        descuento_base = self.descuento_volumen
+        return monto * (self.descuento_volumen + self.recargo_volumen(monto))
 
-        if monto > 5000:
-            descuento_base += 0.05
-        elif monto > 2000:
-            descuento_base += 0.02
-        
-        return monto * descuento_base
+    @classmethod
+    def recargo_volumen(cls, monto):
+        for umbral, recargo in cls.RECARGOS_VOLUMEN:
+            if monto > umbral:
+                return recargo
+        return 0.0
 
     def obtener_beneficios(self):
         #polimorfismo
-        return[
-            "Descuentos por volumen de compra"
-            "Linea de credito corporativa"
-            "Facturacion consolidada"
-            "Account manager dedicado"
-            "Pedidos prioritarios"
-        ]
+        return self.BENEFICIOS
+
+    def uso_beneficios(self):
+        #Credito usado y ya pagado
+        return self.__credito.pagado if self.__credito is not None else 0.0
     
-    def generar_factura(self, compra):
-        descuento = self.calcular_descuento(compra["monto"])
-        return f"""
+    PLANTILLA_FACTURA = PlantillaFactura("""
         FACTURA CORPORATIVA
         ===================
-        Empresa: {self.empresa}
-        RUC: {self.get_ruc()}
-        Contacto: {self.get_nombre()}
+        Empresa: {empresa}
+        RUC: {ruc}
+        Contacto: {cliente}
         -------------------
-        Subtotal: ${compra["monto"]:,.2f}
+        Subtotal: ${subtotal:,.2f}
         Descuento corporativo: ${descuento:,.2f}
-        TOTAL: ${compra["monto"] - descuento:,.2f}
+        TOTAL: ${total:,.2f}
         ===================
-        Limite de credito: ${self.limite_credito:,.2f}
-        """
+        Limite de credito: ${limite_credito:,.2f}
+        """)
+
+    def datos_factura(self, compra):
+        descuento = self.calcular_descuento(compra["monto"])
+        return {
+            "tipo": "corporativo",
+            "empresa": self.empresa,
+            "ruc": self.get_ruc(),
+            "cliente": self.get_nombre(),
+            "subtotal": compra["monto"],
+            "descuento": descuento,
+            "total": compra["monto"] - descuento,
+            "limite_credito": self.limite_credito,
+        }
     
 #Herencia
 class Afiliado(Cliente):
+    __slots__ = ("codigo_afiliado", "comision_porcentaje", "referidos")
+    DESCUENTO = 0.05
+    COMISION = 0.05
+    BONO_POR_REFERIDO = 0.001
+    REFERIDOS_MAX_BONO = 10
+    REFERIDOS_FRECUENTES = 5
+    BENEFICIOS = (
+        "5% de descuento en todas las compras",
+        "Comision por referidos",
+        "Codigo de afiliado personal",
+    )
+    BENEFICIO_FRECUENTE = "Comision bonus por referidos frecuentes"
+
+    @classmethod
+    def _precalcular(cls):
+        cls.BENEFICIOS_FRECUENTES = cls.BENEFICIOS + (cls.BENEFICIO_FRECUENTE,)
+
     def __init__(self, nombre, email, telefono, codigo_afiliado):
         super().__init__(nombre, email, telefono)
         self.codigo_afiliado = codigo_afiliado
-        self.comision_porcentaje = 0.05
+        self.comision_porcentaje = self.COMISION
         self.referidos = 0
 
     #polimorfismo
     def calcular_descuento(self, monto):
-        descuento_base = monto * 0.05
-        comision_adicional = monto * (min(self.referidos, 10) * 0.001)
+        descuento_base = monto * self.DESCUENTO
+        comision_adicional = monto * (min(self.referidos, self.REFERIDOS_MAX_BONO) * self.BONO_POR_REFERIDO)
         
         return descuento_base + comision_adicional
 
     def obtener_beneficios(self):
         #polimorfismo
-        beneficios = [
-            "5% de descuento en todas las compras",
-            "Comision por referidos",
-            "Codigo de afiliado personal"
-        ]
-
-        if self.referidos > 5:
-            beneficios.append("Comision bonus por referidos frecuentes")
-        
-        return beneficios
+        if self.referidos > self.REFERIDOS_FRECUENTES:
+            return self.BENEFICIOS_FRECUENTES
+        return self.BENEFICIOS
 
-    def generar_factura(self, compra):
-        #polimorfismo
-        descuento = self.calcular_descuento(compra["monto"])
-        comision = compra["monto"] * self.comision_porcentaje
+    def uso_beneficios(self):
+        #Comisiones generadas por sus referidos
+        return self.red_referidos.comision_total(self)
 
-        return f"""
+    PLANTILLA_FACTURA = PlantillaFactura("""
         FACTURA AFILIADO
         ====================
-        Afiliado: {self.get_nombre()}
-        Codigo: {self.codigo_afiliado}
-        Referidos: {self.referidos}
+        Afiliado: {cliente}
+        Codigo: {codigo_afiliado}
+        Referidos: {referidos}
         --------------------
-        Subtotal: ${compra["monto"]:.2f}
+        Subtotal: ${subtotal:.2f}
         Descuento afiliado: ${descuento:.2f}
         Comision ganada: ${comision:.2f}
-        Total a pagar: ${compra["monto"] - descuento:.2f}
+        Total a pagar: ${total:.2f}
         ====================
         Gracias por su compra.
-        """
+        """)
+
+    def datos_factura(self, compra):
+        #polimorfismo
+        descuento = self.calcular_descuento(compra["monto"])
+        return {
+            "tipo": "afiliado",
+            "cliente": self.get_nombre(),
+            "codigo_afiliado": self.codigo_afiliado,
+            "referidos": self.referidos,
+            "subtotal": compra["monto"],
+            "descuento": descuento,
+            "comision": compra["monto"] * self.comision_porcentaje,
+            "comision_referidos": self.red_referidos.comision_total(self),
+            "total": compra["monto"] - descuento,
+        }
     
     
+#Politicas de descuento y beneficios: valores por defecto en cada clase,
+#sobrescritos desde un JSON sin tocar el codigo
+
+RUTA_POLITICAS = os.environ.get(
+    "POLITICAS_CLIENTES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "politicas_clientes.json")
+)
+
+def _congelar(valor):
+    if isinstance(valor, dict):
+        return MappingProxyType({clave: _congelar(v) for clave, v in valor.items()})
+    if isinstance(valor, list):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+def configurar_clase(clase, politica):
+    for clave, valor in politica.items():
+        atributo = clave.upper()
+        if not hasattr(clase, atributo):
+            raise ValueError(f"Politica desconocida para {clase.__name__}: {clave}")
+        setattr(clase, atributo, _congelar(valor))
+    if hasattr(clase, "_precalcular"):
+        clase._precalcular()
+
+def cargar_politicas(ruta=None):
+    clases = {clase.__name__: clase for clase in (ClienteRegular, ClientePremium, ClienteCorporativo, Afiliado, LibroPuntos)}
+    politicas = {}
+    if ruta is not None or os.path.exists(RUTA_POLITICAS):
+        with open(ruta or RUTA_POLITICAS, encoding="utf-8") as archivo:
+            politicas = json.load(archivo)
+    for nombre, clase in clases.items():
+        configurar_clase(clase, politicas.get(nombre, {}))
+    return politicas
+
+cargar_politicas()
+
+
+#Registro de clientes con indices hash unicos
+
+class RegistroClientes:
+    def __init__(self, clientes=()):
+        self.__por_email = {}
+        self.__por_ruc = {}
+        self.__por_codigo = {}
+        #tipo -> {email: cliente}; el dict mantiene el orden de registro y borra en O(1)
+        self.__por_tipo = {}
+        for cliente in clientes:
+            self.registrar(cliente)
+
+    @staticmethod
+    def normalizar_email(email):
+        return email.strip().lower()
+
+    def registrar(self, cliente):
+        email = self.normalizar_email(cliente.get_email())
+        ruc = cliente.get_ruc() if isinstance(cliente, ClienteCorporativo) else None
+        codigo = cliente.codigo_afiliado if isinstance(cliente, Afiliado) else None
+        #Se validan todas las claves antes de tocar los indices
+        if email in self.__por_email:
+            raise ValueError(f"Ya existe un cliente con email {email}")
+        if ruc is not None and ruc in self.__por_ruc:
+            raise ValueError(f"Ya existe un cliente con RUC {ruc}")
+        if codigo is not None and codigo in self.__por_codigo:
+            raise ValueError(f"Ya existe un afiliado con codigo {codigo}")
+        self.__por_email[email] = cliente
+        if ruc is not None:
+            self.__por_ruc[ruc] = cliente
+        if codigo is not None:
+            self.__por_codigo[codigo] = cliente
+        self.__por_tipo.setdefault(type(cliente), {})[email] = cliente
+        return cliente
+
+    def eliminar(self, email):
+        email = self.normalizar_email(email)
+        cliente = self.__por_email.pop(email, None)
+        if cliente is None:
+            return None
+        if isinstance(cliente, ClienteCorporativo):
+            self.__por_ruc.pop(cliente.get_ruc(), None)
+        if isinstance(cliente, Afiliado):
+            self.__por_codigo.pop(cliente.codigo_afiliado, None)
+        del self.__por_tipo[type(cliente)][email]
+        return cliente
+
+    def cambiar_codigo_afiliado(self, afiliado, codigo):
+        #codigo_afiliado es un atributo publico: cambiarlo por aqui mantiene el indice
+        if codigo in self.__por_codigo and self.__por_codigo[codigo] is not afiliado:
+            raise ValueError(f"Ya existe un afiliado con codigo {codigo}")
+        if self.__por_codigo.get(afiliado.codigo_afiliado) is afiliado:
+            del self.__por_codigo[afiliado.codigo_afiliado]
+        afiliado.codigo_afiliado = codigo
+        self.__por_codigo[codigo] = afiliado
+
+    def buscar_por_email(self, email):
+        return self.__por_email.get(self.normalizar_email(email))
+
+    def buscar_por_ruc(self, ruc):
+        return self.__por_ruc.get(ruc)
+
+    def buscar_por_codigo_afiliado(self, codigo):
+        return self.__por_codigo.get(codigo)
+
+    def iterar_por_tipo(self, tipo):
+        #Incluye subclases de tipo, en orden de registro dentro de cada clase
+        for clase, clientes in self.__por_tipo.items():
+            if issubclass(clase, tipo):
+                yield from clientes.values()
+
+    def contar_por_tipo(self):
+        return {clase.__name__: len(clientes) for clase, clientes in self.__por_tipo.items()}
+
+    def __len__(self):
+        return len(self.__por_email)
+
+    def __contains__(self, email):
+        return self.normalizar_email(email) in self.__por_email
+
+    def __iter__(self):
+        return iter(self.__por_email.values())
+
+
+#Descuentos en lote: mismas reglas que calcular_descuento, con los parametros de cada
+#cliente precalculados en arrays. Sigue siendo un bucle de Python por par (cliente, monto);
+#solo se ahorra el despacho polimorfico, asi que la ganancia es modesta (~1.5x)
+
+class MotorDescuentosLote:
+    def __init__(self, clientes):
+        #Los ids de cliente son las posiciones en esta lista
+        self.clientes = list(clientes)
+        self.refrescar()
+
+    def refrescar(self):
+        #Toma una foto de nivel, puntos y referidos; llamar de nuevo si cambian
+        self.__tasa = array("d")
+        self.__extra = array("d")
+        self.__corporativo = array("b")
+        for cliente in self.clientes:
+            tasa, extra, corporativo = self.__parametros(cliente)
+            self.__tasa.append(tasa)
+            self.__extra.append(extra)
+            self.__corporativo.append(corporativo)
+
+    @staticmethod
+    def __parametros(cliente):
+        #descuento = monto * (tasa + recargo_volumen) + monto * extra
+        if isinstance(cliente, ClienteRegular):
+            descuento_nivel = cliente.DESCUENTO_NIVEL
+            base = descuento_nivel.get(cliente.nivel, descuento_nivel["bronce"])
+            return base + min(cliente.puntos_acumulados * cliente.DESCUENTO_POR_PUNTO, cliente.DESCUENTO_PUNTOS_MAX), 0.0, 0
+        if isinstance(cliente, ClientePremium):
+            return cliente.DESCUENTO, 0.0, 0
+        if isinstance(cliente, ClienteCorporativo):
+            return cliente.descuento_volumen, 0.0, 1
+        if isinstance(cliente, Afiliado):
+            return cliente.DESCUENTO, min(cliente.referidos, cliente.REFERIDOS_MAX_BONO) * cliente.BONO_POR_REFERIDO, 0
+        raise TypeError(f"Tipo de cliente no soportado: {type(cliente).__name__}")
+
+    def calcular(self, ids, montos):
+        tasa, extra, corporativo = self.__tasa, self.__extra, self.__corporativo
+        recargo = ClienteCorporativo.recargo_volumen
+        return array("d", [
+            m * (tasa[i] + (recargo(m) if corporativo[i] else 0.0)) + m * extra[i]
+            for i, m in zip(ids, montos)
+        ])
+
+
+#Segmentacion RFM (recencia, frecuencia, monto) repartida en un pool de procesos
+
+TIPOS_CLIENTE = ("ClienteRegular", "ClientePremium", "ClienteCorporativo", "Afiliado")
+COLUMNAS_RFM = ("tipo", "recencia", "frecuencia", "monetario", "beneficio")
+
+#Clase -> posicion en TIPOS_CLIENTE; las subclases usan la de su tipo base
+_INDICES_TIPO = {}
+
+def indice_tipo(clase):
+    indice = _INDICES_TIPO.get(clase)
+    if indice is None:
+        for base in clase.__mro__:
+            if base.__name__ in TIPOS_CLIENTE:
+                indice = _INDICES_TIPO[clase] = TIPOS_CLIENTE.index(base.__name__)
+                break
+        else:
+            raise TypeError(f"Tipo de cliente no soportado: {clase.__name__}")
+    return indice
+
+def segmento_rfm(r, f, m):
+    if r >= 4 and f >= 4:
+        return "Campeones"
+    if f >= 4:
+        return "Leales" if r >= 3 else "En riesgo"
+    if r >= 4:
+        return "Nuevos" if f <= 1 else "Prometedores"
+    if r <= 2:
+        return "Perdidos" if f <= 2 and m <= 2 else "Hibernando"
+    return "Necesitan atencion"
+
+#Tabla puntaje -> segmento, calculada una vez: puntaje = r * 100 + f * 10 + m
+SEGMENTOS_RFM = {r * 100 + f * 10 + m: segmento_rfm(r, f, m)
+                 for r in range(1, 6) for f in range(1, 6) for m in range(1, 6)}
+
+def _segmentar_particion(particion):
+    #Corre en el proceso hijo: solo recibe arrays y cortes, nunca objetos Cliente
+    tipos, recencia, frecuencia, monetario, beneficio, cortes = particion
+    cortes_r, cortes_f, cortes_m = cortes
+    puntajes = array("h")
+    segmentos = {}
+    por_tipo = [[0, 0, 0.0, 0.0] for _ in TIPOS_CLIENTE]
+    for tipo, dias, veces, gasto, uso in zip(tipos, recencia, frecuencia, monetario, beneficio):
+        acumulado = por_tipo[tipo]
+        acumulado[0] += 1
+        acumulado[1] += veces
+        acumulado[2] += gasto
+        acumulado[3] += uso
+        if veces == 0:
+            puntajes.append(0)
+            segmentos["Sin compras"] = segmentos.get("Sin compras", 0) + 1
+            continue
+        puntaje = ((5 - bisect.bisect_left(cortes_r, dias)) * 100
+                   + (1 + bisect.bisect_right(cortes_f, veces)) * 10
+                   + 1 + bisect.bisect_right(cortes_m, gasto))
+        puntajes.append(puntaje)
+        segmento = SEGMENTOS_RFM[puntaje]
+        segmentos[segmento] = segmentos.get(segmento, 0) + 1
+    return puntajes, segmentos, por_tipo
+
+#Clientes que los procesos hijos heredan al hacer fork: no se serializan
+_clientes_segmentacion = ()
+
+def _extraer_particion(tarea):
+    #Corre en el proceso hijo sobre su copia heredada de la lista de clientes
+    inicio, fin, ahora = tarea
+    datos = SegmentacionRFM.extraer(_clientes_segmentacion[inicio:fin], ahora)
+    return tuple(datos[c] for c in COLUMNAS_RFM)
+
+class SegmentacionRFM:
+    def __init__(self, procesos=None, tamano_particion=250_000, tamano_muestra=100_000, semilla=0):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.tamano_particion = tamano_particion
+        self.tamano_muestra = tamano_muestra
+        #Misma semilla, misma muestra: los cortes no cambian entre ejecuciones
+        self.semilla = semilla
+
+    @staticmethod
+    def extraer(clientes, ahora=None):
+        #O(1) por cliente gracias a los agregados de HistorialCompras; no carga descargados
+        ahora = ahora or datetime.now()
+        datos = {
+            "tipo": array("b"), "recencia": array("l"), "frecuencia": array("l"),
+            "monetario": array("d"), "beneficio": array("d"),
+        }
+        for cliente in clientes:
+            historial = cliente._resumen_historial()
+            ultima = historial.ultima_fecha
+            datos["tipo"].append(indice_tipo(type(cliente)))
+            datos["recencia"].append((ahora - ultima).days if ultima is not None else -1)
+            datos["frecuencia"].append(historial.cantidad)
+            datos["monetario"].append(historial.gasto_total)
+            datos["beneficio"].append(cliente.uso_beneficios())
+        return datos
+
+    def calcular_cortes(self, datos):
+        #Quintiles sobre una muestra de clientes con compras
+        activos = [i for i, veces in enumerate(datos["frecuencia"]) if veces > 0]
+        if not activos:
+            return ((), (), ())
+        muestra = random.Random(self.semilla).sample(activos, min(self.tamano_muestra, len(activos)))
+
+        def quintiles(columna):
+            valores = [columna[i] for i in muestra]
+            return tuple(statistics.quantiles(valores, n=5)) if len(valores) > 1 else tuple(valores) * 4
+        return quintiles(datos["recencia"]), quintiles(datos["frecuencia"]), quintiles(datos["monetario"])
+
+    def segmentar(self, clientes, ahora=None):
+        #Extraccion y puntaje repartidos en el pool. Los hijos leen los clientes que
+        #heredan con fork; sin fork (Windows, macOS) la extraccion queda en este proceso
+        ahora = ahora or datetime.now()
+        if self.procesos == 1 or "fork" not in multiprocessing.get_all_start_methods():
+            return self.ejecutar(self.extraer(clientes, ahora))
+        global _clientes_segmentacion
+        _clientes_segmentacion = clientes if isinstance(clientes, list) else list(clientes)
+        try:
+            with multiprocessing.get_context("fork").Pool(self.procesos) as pool:
+                paso = self.tamano_particion
+                tareas = [(inicio, inicio + paso, ahora) for inicio in range(0, len(_clientes_segmentacion), paso)]
+                datos = self.extraer((), ahora)
+                for columnas in pool.imap(_extraer_particion, tareas):
+                    for nombre, columna in zip(COLUMNAS_RFM, columnas):
+                        datos[nombre].extend(columna)
+                return self.__segmentar(datos, pool.imap)
+        finally:
+            _clientes_segmentacion = ()
+
+    def ejecutar(self, datos):
+        #datos: columnas ya extraidas (ver extraer)
+        if self.procesos == 1:
+            return self.__segmentar(datos, map)
+        with multiprocessing.Pool(self.procesos) as pool:
+            return self.__segmentar(datos, pool.imap)
+
+    def __segmentar(self, datos, mapear):
+        cortes = self.calcular_cortes(datos)
+        total = len(datos["tipo"])
+        paso = self.tamano_particion
+        particiones = [
+            tuple(datos[c][inicio:inicio + paso] for c in COLUMNAS_RFM) + (cortes,)
+            for inicio in range(0, total, paso)
+        ]
+        #imap conserva el orden: los puntajes quedan alineados con los clientes
+        return self.__combinar(mapear(_segmentar_particion, particiones), cortes)
+
+    @staticmethod
+    def __combinar(parciales, cortes):
+        puntajes = array("h")
+        segmentos = {}
+        por_tipo = [[0, 0, 0.0, 0.0] for _ in TIPOS_CLIENTE]
+        for parte_puntajes, parte_segmentos, parte_tipos in parciales:
+            puntajes.extend(parte_puntajes)
+            for segmento, cantidad in parte_segmentos.items():
+                segmentos[segmento] = segmentos.get(segmento, 0) + cantidad
+            for acumulado, parte in zip(por_tipo, parte_tipos):
+                for i, valor in enumerate(parte):
+                    acumulado[i] += valor
+        return {
+            "clientes": len(puntajes),
+            "cortes": cortes,
+            "puntajes": puntajes,
+            "segmentos": segmentos,
+            "por_tipo": {
+                nombre: {"clientes": c, "compras": n, "gasto": g, "uso_beneficios": u}
+                for nombre, (c, n, g, u) in zip(TIPOS_CLIENTE, por_tipo) if c
+            },
+        }
+
+def imprimir_reporte_rfm(resultado):
+    print("REPORTE DE BENEFICIOS POR TIPO DE CLIENTE")
+    print("=" * 60)
+    for nombre, datos in resultado["por_tipo"].items():
+        print(f"{nombre:<20} clientes: {datos['clientes']:>9}  compras: {datos['compras']:>10}  "
+              f"gasto: ${datos['gasto']:>16,.2f}  beneficios: {datos['uso_beneficios']:,.2f}")
+    print("-" * 60)
+    for segmento, cantidad in sorted(resultado["segmentos"].items(), key=lambda par: -par[1]):
+        print(f"{segmento:<20} {cantidad:>9} ({cantidad / resultado['clientes']:.1%})")
+
+
+#Benchmark: motor en lote vs llamada a calcular_descuento por cliente
+def benchmark_descuentos(cantidad_clientes=10_000, pares=1_000_000):
+    print("BENCHMARK DE DESCUENTOS EN LOTE")
+    print("=" * 60)
+    clientes = []
+    for i in range(cantidad_clientes):
+        tipo = i % 4
+        if tipo == 0:
+            cliente = ClienteRegular(f"Cliente {i}", f"c{i}@email.com", "000", ("bronce", "plata", "oro")[i % 3])
+            cliente.puntos_acumulados = i % 80
+        elif tipo == 1:
+            cliente = ClientePremium(f"Cliente {i}", f"c{i}@email.com", "000", 29.99)
+        elif tipo == 2:
+            cliente = ClienteCorporativo(f"Cliente {i}", f"c{i}@email.com", "000", "Empresa", f"RUC{i}")
+        else:
+            cliente = Afiliado(f"Cliente {i}", f"c{i}@email.com", "000", f"AFL-{i}")
+            cliente.referidos = i % 15
+        clientes.append(cliente)
+    ids = array("l", [random.randrange(cantidad_clientes) for _ in range(pares)])
+    montos = array("d", [round(random.uniform(1, 8000), 2) for _ in range(pares)])
+
+    inicio = time.perf_counter()
+    escalar = [clientes[i].calcular_descuento(m) for i, m in zip(ids, montos)]
+    t_escalar = time.perf_counter() - inicio
+
+    motor = MotorDescuentosLote(clientes)
+    inicio = time.perf_counter()
+    lote = motor.calcular(ids, montos)
+    t_lote = time.perf_counter() - inicio
+
+    print(f"Pares (cliente, monto): {pares}")
+    print(f"Por objeto: {t_escalar:.3f} s")
+    print(f"En lote:    {t_lote:.3f} s (x{t_escalar / t_lote:.2f})")
+    print(f"Resultados identicos: {list(lote) == escalar}")
+
+
+#Benchmark: busquedas en el registro a distintos tamaños
+def benchmark_registro(tamanos=(10_000, 100_000, 1_000_000), consultas=200_000):
+    #Cliente mas indices ocupan ~0.5 KB; 10_000_000 necesita ~5 GB de RAM
+    print("BENCHMARK DEL REGISTRO DE CLIENTES")
+    print("=" * 60)
+    for tamano in tamanos:
+        registro = RegistroClientes()
+        for i in range(tamano):
+            tipo = i % 3
+            if tipo == 0:
+                cliente = ClienteRegular(f"Cliente {i}", f"c{i}@email.com", "000")
+            elif tipo == 1:
+                cliente = ClienteCorporativo(f"Cliente {i}", f"c{i}@email.com", "000", "Empresa", f"RUC{i}")
+            else:
+                cliente = Afiliado(f"Cliente {i}", f"c{i}@email.com", "000", f"AFL-{i}")
+            registro.registrar(cliente)
+        emails = [f"C{random.randrange(tamano)}@Email.com" for _ in range(consultas)]
+        rucs = [f"RUC{random.randrange(1, tamano, 3)}" for _ in range(consultas)]
+        inicio = time.perf_counter()
+        for email in emails:
+            registro.buscar_por_email(email)
+        t_email = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        for ruc in rucs:
+            registro.buscar_por_ruc(ruc)
+        t_ruc = time.perf_counter() - inicio
+        print(f"{tamano:>10} clientes: email {t_email / consultas * 1e9:.0f} ns, RUC {t_ruc / consultas * 1e9:.0f} ns por consulta")
+        del registro
+
+
+#Benchmark: reconstruccion del libro de puntos tras un reinicio
+def benchmark_puntos(cantidad_clientes=100_000, compras=2_000_000):
+    print("BENCHMARK DEL LIBRO DE PUNTOS")
+    print("=" * 60)
+    clientes = [ClienteRegular(f"Cliente {i}", f"c{i}@email.com", "000") for i in range(cantidad_clientes)]
+    with tempfile.TemporaryDirectory() as carpeta:
+        libro = LibroPuntos(os.path.join(carpeta, "puntos.tsv"))
+        inicio = time.perf_counter()
+        for i in range(compras):
+            libro.registrar(clientes[i % cantidad_clientes], i, 50.0 + i % 300)
+        libro.cerrar()
+        t_registro = time.perf_counter() - inicio
+        saldos = [cliente.puntos_acumulados for cliente in clientes]
+
+        reiniciados = [ClienteRegular(f"Cliente {i}", f"c{i}@email.com", "000") for i in range(cantidad_clientes)]
+        inicio = time.perf_counter()
+        asientos = LibroPuntos(libro.ruta).reproducir(reiniciados)
+        t_replay = time.perf_counter() - inicio
+    print(f"Registro: {compras} compras en {t_registro:.2f} s")
+    print(f"Replay:   {asientos} asientos en {t_replay:.2f} s")
+    print(f"Saldos identicos: {[cliente.puntos_acumulados for cliente in reiniciados] == saldos}")
+
+
+#Benchmark: muchos compradores de una misma cuenta corporativa en paralelo
+def benchmark_credito(hilos=8, pedidos_por_hilo=20_000):
+    print("BENCHMARK DE CREDITO CORPORATIVO")
+    print("=" * 60)
+    cliente = ClienteCorporativo("Compras", "compras@empresa.com", "000", "Gran Corp", "20999999999")
+    cliente.limite_credito = 50_000.0
+    credito = cliente.credito
+    rechazados = [0] * hilos
+
+    def comprar(n):
+        abiertas = []
+        for i in range(pedidos_por_hilo):
+            try:
+                abiertas.append(credito.reservar(100.0 + (i * 7 + n) % 400))
+            except ValueError:
+                rechazados[n] += 1
+            if len(abiertas) > 20:
+                id_reserva = abiertas.pop(0)
+                if i % 5 == 0:
+                    credito.cancelar(id_reserva)
+                else:
+                    credito.pagar(id_reserva)
+        for id_reserva in abiertas:
+            credito.pagar(id_reserva)
+
+    trabajadores = [threading.Thread(target=comprar, args=(n,)) for n in range(hilos)]
+    inicio = time.perf_counter()
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    segundos = time.perf_counter() - inicio
+    total = hilos * pedidos_por_hilo
+    print(f"Pedidos: {total} en {segundos:.2f} s ({total / segundos:,.0f} pedidos/s), rechazados: {sum(rechazados)}")
+    print(f"Exposicion final: {credito.expuesto:.2f} - Reservas abiertas: {len(credito.reservas_abiertas())}")
+
+
+#Benchmark: segmentacion RFM con distinto numero de procesos
+def benchmark_segmentacion(cantidad=1_000_000, procesos=None):
+    #Columnas sinteticas: 10_000_000 clientes como objetos no caben en memoria aqui
+    print("BENCHMARK DE SEGMENTACION RFM")
+    print("=" * 60)
+    datos = {
+        "tipo": array("b", [i % 4 for i in range(cantidad)]),
+        "recencia": array("l", [random.randrange(365) for _ in range(cantidad)]),
+        "frecuencia": array("l", [random.randrange(40) for _ in range(cantidad)]),
+        "monetario": array("d", [random.uniform(0, 20_000) for _ in range(cantidad)]),
+        "beneficio": array("d", [random.uniform(0, 500) for _ in range(cantidad)]),
+    }
+    maximo = procesos or os.cpu_count() or 1
+    niveles = sorted({1, 2, 4, maximo} if maximo > 1 else {1})
+    referencia = None
+    for n in (n for n in niveles if n <= maximo):
+        inicio = time.perf_counter()
+        resultado = SegmentacionRFM(procesos=n).ejecutar(datos)
+        segundos = time.perf_counter() - inicio
+        referencia = referencia or segundos
+        print(f"{n:>2} procesos: {segundos:.2f} s (aceleracion x{referencia / segundos:.2f})")
+    imprimir_reporte_rfm(resultado)
+
+
+#Benchmark de memoria por tipo de cliente
+class _ClienteConDict:
+    #Reproduce el diseño anterior: atributos en __dict__ e historial en una lista
+    def __init__(self, atributos):
+        for nombre, valor in atributos.items():
+            setattr(self, nombre, datetime.now() if isinstance(valor, datetime) else valor)
+        self._historial_compras = []
+
+def _fabrica_con_dict(modelo):
+    atributos = {}
+    for clase in reversed(type(modelo).__mro__):
+        for nombre in clase.__dict__.get("__slots__", ()):
+            if nombre.startswith("__"):
+                nombre = f"_{clase.__name__}{nombre}"
+            if nombre in ("_Cliente__historial", "_almacen", "_ClienteCorporativo__credito"):
+                continue
+            atributos[nombre] = getattr(modelo, nombre)
+    #Una clase por tipo para que los __dict__ compartan llaves como en el diseño original
+    clase = type(f"{type(modelo).__name__}_con_dict", (_ClienteConDict,), {})
+    return lambda: clase(atributos)
+
+def _bytes_por_cliente(fabrica, cantidad, almacen=None):
+    #Se excluye lo que reserva el propio almacen (indice de dbm, pickles en transito)
+    filtros = [tracemalloc.Filter(False, "*/dbm/*"), tracemalloc.Filter(False, shelve.__file__)]
+    tracemalloc.start()
+    inicio = tracemalloc.take_snapshot().filter_traces(filtros)
+    clientes = [fabrica() for _ in range(cantidad)]
+    if almacen is not None:
+        for cliente in clientes:
+            almacen.descargar(cliente)
+    fin = tracemalloc.take_snapshot().filter_traces(filtros)
+    tracemalloc.stop()
+    usado = sum(estadistica.size_diff for estadistica in fin.compare_to(inicio, "filename"))
+    del clientes
+    return usado / cantidad
+
+def benchmark_memoria(cantidad=200_000, descargados=20_000):
+    print("BENCHMARK DE MEMORIA POR CLIENTE")
+    print("=" * 60)
+    nombre, email, telefono = "Cliente Ejemplo", "cliente@email.com", "999999999"
+    fabricas = {
+        "ClienteRegular": lambda: ClienteRegular(nombre, email, telefono, "plata"),
+        "ClientePremium": lambda: ClientePremium(nombre, email, telefono, 29.99),
+        "ClienteCorporativo": lambda: ClienteCorporativo(nombre, email, telefono, "Tech Corp", "20123456789"),
+        "Afiliado": lambda: Afiliado(nombre, email, telefono, "AFL-001"),
+    }
+    print(f"{'Tipo':<20}{'__dict__':>10}{'__slots__':>11}{'descargado':>12}")
+    with tempfile.TemporaryDirectory() as carpeta:
+        for tipo, fabrica in fabricas.items():
+            antes = _bytes_por_cliente(_fabrica_con_dict(fabrica()), cantidad)
+            despues = _bytes_por_cliente(fabrica, cantidad)
+            almacen = AlmacenClientes(os.path.join(carpeta, tipo))
+            descargado = _bytes_por_cliente(fabrica, descargados, almacen)
+            almacen.cerrar()
+            print(f"{tipo:<20}{antes:>8.0f} B{despues:>9.0f} B{descargado:>10.0f} B")
+
+
+#Benchmark de facturacion masiva
+def benchmark_facturas(cantidad=200_000):
+    print("BENCHMARK DE FACTURACION EN LOTE")
+    print("=" * 60)
+    clientes = [
+        ClientePremium("María García", "maria@email.com", "987654321", 29.99),
+        ClienteCorporativo("Carlos Ruiz", "carlos@empresa.com", "555555555", "Tech Corp", "20123456789"),
+        Afiliado("Ana López", "ana@email.com", "111111111", "AFL-001"),
+    ]
+    pares = [(clientes[i % 3], {"monto": 100.0 + i % 5000}) for i in range(cantidad)]
+    renderizador = RenderizadorFacturas()
+    for formato in ("texto", "json"):
+        inicio = time.perf_counter()
+        salida = renderizador.renderizar_lote(pares, formato)
+        segundos = time.perf_counter() - inicio
+        print(f"{formato:>6}: {cantidad} facturas en {segundos:.2f} s ({cantidad / segundos:,.0f}/s, {len(salida) / 1e6:.1f} MB)")
+
+
 #demostrar polimorfismo
 def demostrar_polimorfismo():
     print("DEMOSTRACION DE POLIMORFISMO")
@@ -300,7 +1570,15 @@ def demostrar_polimorfismo():
         print("Factura generada con formato especifico")
 
 #Ejemplo de uso
-if __name__ == "__main__":
+if __name__ == "__main__" and "--benchmark" in sys.argv:
+    benchmark_descuentos()
+    benchmark_facturas()
+    benchmark_registro()
+    benchmark_puntos()
+    benchmark_credito()
+    benchmark_segmentacion()
+    benchmark_memoria()
+elif __name__ == "__main__":
     demostrar_polimorfismo()
 
     print("\n\n" + "=" * 60)
@@ -315,6 +1593,9 @@ if __name__ == "__main__":
     cliente_regular.agregar_compra(compra_grande)
     cliente_premium.agregar_compra(compra_grande)
 
+    print("\n ESTADISTICAS DE COMPRAS:")
+    print(cliente_regular.obtener_estadisticas())
+
     print("\n FACTURA CLIENTE REGULAR:")
     print(cliente_regular.generar_factura(compra_grande))
     
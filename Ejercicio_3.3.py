@@ -38,8 +38,18 @@ ENTREGABLES:
 """
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Callable, Iterable, Tuple, Mapping
 from enum import Enum
+from types import MappingProxyType
+from array import array
+import io
+import math
+import os
+import struct
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
 
 # =============================================
 # ENUMS para estados y tipos
@@ -52,6 +62,23 @@ class EstadoPedido(Enum):
     ENTREGADO = "Entregado"
     CANCELADO = "Cancelado"
 
+# Tabla de transiciones válidas, compilada una sola vez a máscaras de bits:
+# anterior -> nuevo es válida si MASCARA_TRANSICIONES[anterior] & BIT_ESTADO[nuevo].
+TRANSICIONES_VALIDAS = {
+    EstadoPedido.PENDIENTE: (EstadoPedido.CONFIRMADO, EstadoPedido.CANCELADO),
+    EstadoPedido.CONFIRMADO: (EstadoPedido.PREPARACION, EstadoPedido.CANCELADO),
+    EstadoPedido.PREPARACION: (EstadoPedido.ENVIADO, EstadoPedido.CANCELADO),
+    EstadoPedido.ENVIADO: (EstadoPedido.ENTREGADO,),
+    EstadoPedido.ENTREGADO: (),
+    EstadoPedido.CANCELADO: (),
+}
+ESTADOS_POR_INDICE = tuple(EstadoPedido)
+INDICE_ESTADO: Dict[EstadoPedido, int] = {estado: i for i, estado in enumerate(ESTADOS_POR_INDICE)}
+BIT_ESTADO: Dict[EstadoPedido, int] = {estado: 1 << i for estado, i in INDICE_ESTADO.items()}
+MASCARA_TRANSICIONES: Dict[EstadoPedido, int] = {
+    estado: sum(BIT_ESTADO[destino] for destino in destinos) for estado, destinos in TRANSICIONES_VALIDAS.items()
+}
+
 class TipoEnvio(Enum):
     ESTANDAR = "Estándar"
     EXPRESS = "Express"
@@ -66,17 +93,31 @@ class Pedido(ABC):
     CLASE ABSTRACTA que define la estructura base para todos los tipos de pedidos.
     No se puede instanciar directamente - sirve como plantilla para pedidos específicos.
     """
-    
+
+    # Inventario compartido opcional: cualquier objeto con disponible(codigo_SKU) -> int
+    inventario = None
+
+    # Hooks de transición: pares (clase, hook) agregados con registrar_hook(). La tupla se
+    # reemplaza completa al registrar o quitar, nunca se modifica mientras se recorre
+    _hooks_transicion: Tuple[Tuple[type, Callable], ...] = ()
+
     def __init__(self, numero_pedido: str, cliente: str, productos: List[Dict], direccion_entrega: str):
         # ENCAPSULAMIENTO: Atributos privados
         self.__numero_pedido = numero_pedido
         self.__fecha = datetime.now()
         self.__cliente = cliente
-        self.__productos = productos
+        # Cada línea se copia una vez y se guarda como vista de solo lectura
+        self.__productos = [MappingProxyType(dict(producto)) for producto in productos]
+        self.__vista_productos: Optional[Tuple[Mapping, ...]] = None
         self.__estado = EstadoPedido.PENDIENTE
         
         # ENCAPSULAMIENTO: Atributo protegido
         self._direccion_entrega = direccion_entrega
+        # Repositorios que indexan este pedido (se avisan en cada cambio de estado)
+        self._repositorios = ()
+        # Cachés de costos y tiempo de entrega: se invalidan al cambiar líneas o parámetros de envío
+        self._desglose: Optional[Mapping[str, float]] = None
+        self._tiempo_entrega: Optional[str] = None
     
     # ENCAPSULAMIENTO: Getters para acceso controlado
     def get_numero_pedido(self) -> str:
@@ -91,18 +132,47 @@ class Pedido(ABC):
     def get_estado(self) -> EstadoPedido:
         return self.__estado
     
-    def get_productos(self) -> List[Dict]:
-        return self.__productos.copy()  # Retorna copia para proteger datos
+    def get_productos(self) -> Tuple[Mapping, ...]:
+        """Vista de solo lectura de las líneas: no se copian en cada llamada"""
+        if self.__vista_productos is None:
+            self.__vista_productos = tuple(self.__productos)
+        return self.__vista_productos
+
+    # Modificación de líneas: la única vía para cambiar productos, invalida las cachés
+    def agregar_producto(self, producto: Dict) -> None:
+        self.__productos.append(MappingProxyType(dict(producto)))
+        self._invalidar_costos()
+
+    def actualizar_cantidad(self, indice: int, cantidad: int) -> None:
+        linea = dict(self.__productos[indice])
+        linea['cantidad'] = cantidad
+        self.__productos[indice] = MappingProxyType(linea)
+        self._invalidar_costos()
+
+    def quitar_producto(self, indice: int) -> Mapping:
+        linea = self.__productos.pop(indice)
+        self._invalidar_costos()
+        return linea
+
+    def _invalidar_costos(self) -> None:
+        """Llamado al cambiar líneas o cualquier parámetro de envío de las subclases"""
+        self.__vista_productos = None
+        self._desglose = None
+        self._tiempo_entrega = None
     
     # ENCAPSULAMIENTO: Método privado para validación interna
     def __validar_stock_disponible(self) -> bool:
         """
         MÉTODO PRIVADO: Solo accesible dentro de esta clase
-        Simula validación de stock en inventario
+        Valida cantidades y, si hay un inventario configurado (por ejemplo el
+        MotorReservas del catálogo), consulta el stock disponible por 'codigo_SKU'
         """
         for producto in self.__productos:
-            # Simulación de validación de stock
-            if producto.get('cantidad', 0) <= 0:
+            cantidad = producto.get('cantidad', 0)
+            if cantidad <= 0:
+                return False
+            sku = producto.get('codigo_SKU')
+            if self.inventario is not None and sku is not None and self.inventario.disponible(sku) < cantidad:
                 return False
         return True
     
@@ -111,26 +181,138 @@ class Pedido(ABC):
         """
         ENCAPSULAMIENTO: Control de transiciones de estado con validación
         """
-        transiciones_validas = {
-            EstadoPedido.PENDIENTE: [EstadoPedido.CONFIRMADO, EstadoPedido.CANCELADO],
-            EstadoPedido.CONFIRMADO: [EstadoPedido.PREPARACION, EstadoPedido.CANCELADO],
-            EstadoPedido.PREPARACION: [EstadoPedido.ENVIADO, EstadoPedido.CANCELADO],
-            EstadoPedido.ENVIADO: [EstadoPedido.ENTREGADO],
-            EstadoPedido.ENTREGADO: [],
-            EstadoPedido.CANCELADO: []
-        }
-        
-        if nuevo_estado in transiciones_validas[self.__estado]:
-            self.__estado = nuevo_estado
+        anterior = self.__estado
+        if self._aplicar_transicion(nuevo_estado):
             print(f"✅ Pedido {self.__numero_pedido} cambió a: {nuevo_estado.value}")
             return True
         else:
-            print(f"❌ Transición inválida: {self.__estado.value} -> {nuevo_estado.value}")
+            print(f"❌ Transición inválida: {anterior.value} -> {nuevo_estado.value}")
             return False
+
+    def _aplicar_transicion(self, nuevo_estado: EstadoPedido, errores: Optional[List] = None) -> bool:
+        """
+        Valida con la tabla compilada y aplica el cambio, sin imprimir.
+        Con una lista errores, un hook que falla se anota ahí y no se propaga.
+        """
+        anterior = self.__estado
+        try:
+            destino = BIT_ESTADO[nuevo_estado]
+        except (KeyError, TypeError):
+            raise TypeError(f"Estado inválido: {nuevo_estado!r} (se esperaba un EstadoPedido)") from None
+        if not MASCARA_TRANSICIONES[anterior] & destino:
+            return False
+        self.__estado = nuevo_estado
+        for repositorio in self._repositorios:
+            repositorio._estado_cambiado(self, self.__numero_pedido, anterior, nuevo_estado)
+        for clase, hook in Pedido._hooks_transicion:
+            if isinstance(self, clase):
+                try:
+                    hook(self, anterior, nuevo_estado)
+                except Exception as error:
+                    if errores is None:
+                        raise
+                    errores.append((self, hook, error))
+        return True
+
+    def _restaurar_estado(self, estado: EstadoPedido) -> None:
+        """
+        Fija el estado reconstruido desde la bitácora: sin validar ni llamar hooks
+        (no es una transición nueva), pero sí avisa a los repositorios que lo indexan
+        """
+        anterior = self.__estado
+        if estado is anterior:
+            return
+        self.__estado = estado
+        for repositorio in self._repositorios:
+            repositorio._estado_cambiado(self, self.__numero_pedido, anterior, estado)
+
+    @staticmethod
+    def cambiar_estado_lote(cambios: Iterable[Tuple["Pedido", EstadoPedido]],
+                            errores: Optional[List] = None) -> List[bool]:
+        """
+        Aplica muchas transiciones (por ejemplo, una sincronización con el
+        transportista) y devuelve el resultado de cada una, sin imprimir.
+        Un hook que falla no corta el lote: se agrega a errores como
+        (pedido, hook, excepción), o sin esa lista se lanza RuntimeError al final.
+        """
+        fallos = [] if errores is None else errores
+        resultados = [pedido._aplicar_transicion(nuevo_estado, fallos) for pedido, nuevo_estado in cambios]
+        Pedido._verificar_fallos_lote(fallos, errores)
+        return resultados
+
+    @staticmethod
+    def _verificar_fallos_lote(fallos: List, errores: Optional[List]) -> None:
+        if errores is None and fallos:
+            raise RuntimeError(
+                f"{len(fallos)} hooks de transición fallaron; los cambios de estado sí se aplicaron"
+            ) from fallos[0][2]
+
+    @classmethod
+    def registrar_hook(cls, hook: Callable) -> Callable[[], None]:
+        """
+        Agrega un hook(pedido, anterior, nuevo) para los pedidos de esta clase y sus
+        subclases; las notificaciones van aquí, no en el camino crítico.
+        Devuelve una función que quita exactamente este registro.
+        """
+        entrada = (cls, hook)
+        Pedido._hooks_transicion = Pedido._hooks_transicion + (entrada,)
+
+        def quitar() -> None:
+            Pedido._hooks_transicion = tuple(e for e in Pedido._hooks_transicion if e is not entrada)
+        return quitar
+
+    @classmethod
+    def quitar_hook(cls, hook: Callable) -> None:
+        """Quita los registros de hook hechos sobre esta misma clase"""
+        hooks = Pedido._hooks_transicion
+        restantes = tuple(e for e in hooks if not (e[0] is cls and e[1] == hook))
+        if len(restantes) == len(hooks):
+            raise ValueError(f"El hook no está registrado en {cls.__name__}")
+        Pedido._hooks_transicion = restantes
     
     def calcular_subtotal(self) -> float:
         """Calcula el subtotal de los productos (sin envío ni impuestos)"""
-        return sum(producto['precio'] * producto.get('cantidad', 1) for producto in self.__productos)
+        return self.desglose_costos()['subtotal']
+
+    def desglose_costos(self) -> Mapping[str, float]:
+        """
+        Subtotal, envío, impuestos y total calculados una sola vez y guardados
+        hasta que cambien las líneas o los parámetros de envío
+        """
+        if self._desglose is None:
+            subtotal = sum(producto['precio'] * producto.get('cantidad', 1) for producto in self.__productos)
+            envio = self._costo_envio(subtotal)
+            impuestos = self._impuestos(subtotal)
+            self._desglose = MappingProxyType({
+                'subtotal': subtotal,
+                'envio': envio,
+                'impuestos': impuestos,
+                'total': self._componer_total(subtotal, envio, impuestos),
+            })
+        return self._desglose
+
+    @staticmethod
+    def _componer_total(subtotal: float, envio: float, impuestos: float) -> float:
+        """Única fórmula del total (también la usa CotizadorEnvios): mismo orden de suma"""
+        return subtotal + envio + impuestos
+
+    def tiempo_entrega(self) -> str:
+        """calcular_tiempo_entrega() con caché"""
+        if self._tiempo_entrega is None:
+            self._tiempo_entrega = self.calcular_tiempo_entrega()
+        return self._tiempo_entrega
+
+    @classmethod
+    def tiempo_entrega_por_defecto(cls) -> str:
+        """Tiempo de entrega con los valores de clase, sin crear un pedido"""
+        return cls.TIEMPO_ENTREGA
+
+    # Cálculos internos protegidos: cada subclase define su envío e impuestos
+    def _costo_envio(self, subtotal: float) -> float:
+        return 0.0
+
+    def _impuestos(self, subtotal: float) -> float:
+        return 0.0
     
     # =============================================
     # ABSTRACCIÓN: Métodos abstractos (POLIMORFISMO)
@@ -163,14 +345,15 @@ class Pedido(ABC):
         """
         Método que demuestra POLIMORFISMO llamando a métodos abstractos
         """
+        desglose = self.desglose_costos()
         return {
             'numero_pedido': self.get_numero_pedido(),
             'cliente': self.get_cliente(),
             'estado': self.get_estado().value,
             'tipo_envio': self.__class__.__name__,
-            'subtotal': self.calcular_subtotal(),
+            'subtotal': desglose['subtotal'],
             'costo_total': self.calcular_costo_total(),
-            'tiempo_entrega': self.calcular_tiempo_entrega(),
+            'tiempo_entrega': self.tiempo_entrega(),
             'notificacion': self.notificar_cliente()
         }
 
@@ -183,14 +366,38 @@ class PedidoEstandar(Pedido):
     HERENCIA: PedidoEstandar ES UN tipo de Pedido
     Hereda todos los atributos y métodos de la clase base Pedido
     """
+
+    # Valores por defecto (también los usa CotizadorEnvios)
+    RANGO_ENTREGA_DIAS = (3, 5)
+    COSTO_ENVIO_FIJO = 5.99
+    TIEMPO_ENTREGA = "{}-{} días hábiles"
     
     def __init__(self, numero_pedido: str, cliente: str, productos: List[Dict], direccion_entrega: str):
         # HERENCIA: Llamada al constructor de la clase padre
         super().__init__(numero_pedido, cliente, productos, direccion_entrega)
         
         # Atributos específicos de PedidoEstandar
-        self.rango_entrega_dias = (3, 5)
-        self.costo_envio_fijo = 5.99
+        self.rango_entrega_dias = self.RANGO_ENTREGA_DIAS
+        self.costo_envio_fijo = self.COSTO_ENVIO_FIJO
+
+    # Parámetros de envío como propiedades: cambiarlos invalida las cachés
+    @property
+    def rango_entrega_dias(self) -> Tuple[int, int]:
+        return self._rango_entrega_dias
+
+    @rango_entrega_dias.setter
+    def rango_entrega_dias(self, valor: Tuple[int, int]) -> None:
+        self._rango_entrega_dias = valor
+        self._invalidar_costos()
+
+    @property
+    def costo_envio_fijo(self) -> float:
+        return self._costo_envio_fijo
+
+    @costo_envio_fijo.setter
+    def costo_envio_fijo(self, valor: float) -> None:
+        self._costo_envio_fijo = valor
+        self._invalidar_costos()
     
     # =============================================
     # POLIMORFISMO: Implementación específica
@@ -200,21 +407,26 @@ class PedidoEstandar(Pedido):
         POLIMORFISMO: Implementación única para envío estándar
         Tiempo de entrega: 3-5 días hábiles
         """
-        min_dias, max_dias = self.rango_entrega_dias
-        return f"{min_dias}-{max_dias} días hábiles"
+        return self.TIEMPO_ENTREGA.format(*self.rango_entrega_dias)
+
+    @classmethod
+    def tiempo_entrega_por_defecto(cls) -> str:
+        return cls.TIEMPO_ENTREGA.format(*cls.RANGO_ENTREGA_DIAS)
     
     def calcular_costo_total(self) -> float:
         """
         POLIMORFISMO: Cálculo de costo con envío fijo
         """
-        subtotal = self.calcular_subtotal()
-        return subtotal + self.costo_envio_fijo
+        return self.desglose_costos()['total']
+
+    def _costo_envio(self, subtotal: float) -> float:
+        return self.costo_envio_fijo
     
     def notificar_cliente(self) -> str:
         """
         POLIMORFISMO: Notificación por email para envíos estándar
         """
-        return f"📧 Email enviado a {self.get_cliente()}: Su pedido estándar #{self.get_numero_pedido()} será entregado en {self.calcular_tiempo_entrega()}"
+        return f"📧 Email enviado a {self.get_cliente()}: Su pedido estándar #{self.get_numero_pedido()} será entregado en {self.tiempo_entrega()}"
 
 
 # =============================================
@@ -222,11 +434,23 @@ class PedidoEstandar(Pedido):
 # =============================================
 class PedidoExpress(Pedido):
     """HERENCIA: PedidoExpress ES UN tipo de Pedido con entrega rápida"""
+
+    RECARGO_EXPRESS = 12.99
+    TIEMPO_ENTREGA = "24 horas"
     
     def __init__(self, numero_pedido: str, cliente: str, productos: List[Dict], direccion_entrega: str):
         super().__init__(numero_pedido, cliente, productos, direccion_entrega)
         self.entrega_24h = True
-        self.recargo_express = 12.99
+        self.recargo_express = self.RECARGO_EXPRESS
+
+    @property
+    def recargo_express(self) -> float:
+        return self._recargo_express
+
+    @recargo_express.setter
+    def recargo_express(self, valor: float) -> None:
+        self._recargo_express = valor
+        self._invalidar_costos()
     
     # =============================================
     # POLIMORFISMO: Implementación única para Express
@@ -235,14 +459,16 @@ class PedidoExpress(Pedido):
         """
         POLIMORFISMO: Entrega en 24 horas para express
         """
-        return "24 horas"
+        return self.TIEMPO_ENTREGA
     
     def calcular_costo_total(self) -> float:
         """
         POLIMORFISMO: Cálculo con recargo express
         """
-        subtotal = self.calcular_subtotal()
-        return subtotal + self.recargo_express
+        return self.desglose_costos()['total']
+
+    def _costo_envio(self, subtotal: float) -> float:
+        return self.recargo_express
     
     def notificar_cliente(self) -> str:
         """
@@ -256,6 +482,8 @@ class PedidoExpress(Pedido):
 # =============================================
 class PedidoRetiroTienda(Pedido):
     """HERENCIA: PedidoRetiroTienda ES UN tipo de Pedido para retiro en tienda"""
+
+    TIEMPO_ENTREGA = "2 horas (una vez preparado)"
     
     def __init__(self, numero_pedido: str, cliente: str, productos: List[Dict], tienda_seleccionada: str):
         # Para retiro en tienda, la dirección es la ubicación de la tienda
@@ -272,13 +500,13 @@ class PedidoRetiroTienda(Pedido):
         """
         POLIMORFISMO: Retiro inmediato después de preparación
         """
-        return "2 horas (una vez preparado)"
+        return self.TIEMPO_ENTREGA
     
     def calcular_costo_total(self) -> float:
         """
         POLIMORFISMO: Sin costo de envío para retiro en tienda
         """
-        return self.calcular_subtotal()  # Solo subtotal, sin envío
+        return self.desglose_costos()['total']  # Solo subtotal, sin envío
     
     def notificar_cliente(self) -> str:
         """
@@ -287,30 +515,62 @@ class PedidoRetiroTienda(Pedido):
         return f"📱 Notificación en APP: Pedido #{self.get_numero_pedido()} listo para retiro. Código: {self.codigo_retiro}. Tienda: {self.tienda_seleccionada}"
 
 
+# Envío internacional: tabla país -> región y costo por país precalculado (base + recargo de su región)
+ENVIO_INTERNACIONAL_BASE = 25.0
+RECARGO_POR_REGION = {"America del Norte": 10.0, "Europa": 15.0, "Resto del mundo": 20.0}
+REGION_POR_PAIS = {
+    "EEUU": "America del Norte", "Canada": "America del Norte", "Mexico": "America del Norte",
+    "Europa": "Europa", "UK": "Europa",
+}
+COSTO_ENVIO_POR_PAIS = MappingProxyType({
+    pais: ENVIO_INTERNACIONAL_BASE + RECARGO_POR_REGION[region] for pais, region in REGION_POR_PAIS.items()
+})
+COSTO_ENVIO_OTROS = ENVIO_INTERNACIONAL_BASE + RECARGO_POR_REGION["Resto del mundo"]
+
+
 # =============================================
 # HERENCIA: PedidoInternacional hereda de Pedido
 # =============================================
 class PedidoInternacional(Pedido):
     """HERENCIA: PedidoInternacional ES UN tipo de Pedido para envíos internacionales"""
+
+    IMPUESTOS_IMPORTACION = 0.15
+    TIEMPO_ENTREGA = "15-30 días hábiles (incluye aduana)"
     
     def __init__(self, numero_pedido: str, cliente: str, productos: List[Dict], direccion_entrega: str, pais_destino: str):
         super().__init__(numero_pedido, cliente, productos, direccion_entrega)
         
         self.pais_destino = pais_destino
         self.aduana = True
-        self.impuestos_importacion = 0.15  # 15% de impuestos
+        self.impuestos_importacion = self.IMPUESTOS_IMPORTACION  # 15% de impuestos
+
+    @property
+    def pais_destino(self) -> str:
+        return self._pais_destino
+
+    @pais_destino.setter
+    def pais_destino(self, valor: str) -> None:
+        self._pais_destino = valor
+        self._invalidar_costos()
+
+    @property
+    def impuestos_importacion(self) -> float:
+        return self._impuestos_importacion
+
+    @impuestos_importacion.setter
+    def impuestos_importacion(self, valor: float) -> None:
+        self._impuestos_importacion = valor
+        self._invalidar_costos()
     
     # ENCAPSULAMIENTO: Método protegido para cálculo interno
     def _calcular_costo_envio_internacional(self) -> float:
         """Método protegido para cálculo específico de envío internacional"""
-        base_envio = 25.0
-        # Costo adicional por distancia/región
-        if self.pais_destino in ["EEUU", "Canada", "Mexico"]:
-            return base_envio + 10.0
-        elif self.pais_destino in ["Europa", "UK"]:
-            return base_envio + 15.0
-        else:
-            return base_envio + 20.0
+        return self.costo_envio_pais(self.pais_destino)
+
+    @staticmethod
+    def costo_envio_pais(pais: str) -> float:
+        """Base + recargo por región, ya sumados en la tabla (también lo usa CotizadorEnvios)"""
+        return COSTO_ENVIO_POR_PAIS.get(pais, COSTO_ENVIO_OTROS)
     
     # =============================================
     # POLIMORFISMO: Implementación internacional
@@ -319,23 +579,352 @@ class PedidoInternacional(Pedido):
         """
         POLIMORFISMO: Tiempo extendido para envíos internacionales
         """
-        return "15-30 días hábiles (incluye aduana)"
+        return self.TIEMPO_ENTREGA
     
     def calcular_costo_total(self) -> float:
         """
         POLIMORFISMO: Cálculo con envío internacional + impuestos
         """
-        subtotal = self.calcular_subtotal()
-        costo_envio = self._calcular_costo_envio_internacional()
-        impuestos = subtotal * self.impuestos_importacion
-        
-        return subtotal + costo_envio + impuestos
+        return self.desglose_costos()['total']
+
+    def _costo_envio(self, subtotal: float) -> float:
+        return self._calcular_costo_envio_internacional()
+
+    def _impuestos(self, subtotal: float) -> float:
+        return self.calcular_impuestos(subtotal, self.impuestos_importacion)
+
+    @staticmethod
+    def calcular_impuestos(subtotal: float, tasa: float) -> float:
+        return subtotal * tasa
     
     def notificar_cliente(self) -> str:
         """
         POLIMORFISMO: Notificación detallada con documentación internacional
         """
-        return f"📧 Email internacional: Pedido #{self.get_numero_pedido()} enviado a {self.pais_destino}. Incluye documentación de aduana. Tiempo: {self.calcular_tiempo_entrega()}"
+        return f"📧 Email internacional: Pedido #{self.get_numero_pedido()} enviado a {self.pais_destino}. Incluye documentación de aduana. Tiempo: {self.tiempo_entrega()}"
+
+
+# =============================================
+# REPOSITORIO DE PEDIDOS CON ÍNDICES
+# =============================================
+class RepositorioPedidos:
+    """
+    Guarda los pedidos indexados por número, estado, cliente y tipo de envío.
+    El índice de estado se actualiza en cada cambiar_estado(), así que contar
+    pedidos por estado es O(1) y listar un estado no recorre todos los pedidos.
+    """
+
+    def __init__(self, pedidos=()):
+        self.__por_numero: Dict[str, Pedido] = {}
+        # Un dict por estado: conserva el orden de llegada y elimina en O(1)
+        self.__por_estado: Dict[EstadoPedido, Dict[str, Pedido]] = {estado: {} for estado in EstadoPedido}
+        self.__por_cliente: Dict[str, Dict[str, Pedido]] = {}
+        self.__por_tipo: Dict[type, Dict[str, Pedido]] = {}
+        for pedido in pedidos:
+            self.agregar(pedido)
+
+    def agregar(self, pedido: Pedido) -> Pedido:
+        numero = pedido.get_numero_pedido()
+        if numero in self.__por_numero:
+            raise ValueError(f"Ya existe un pedido con número {numero}")
+        self.__por_numero[numero] = pedido
+        self.__por_estado[pedido.get_estado()][numero] = pedido
+        self.__por_cliente.setdefault(pedido.get_cliente(), {})[numero] = pedido
+        self.__por_tipo.setdefault(type(pedido), {})[numero] = pedido
+        pedido._repositorios = pedido._repositorios + (self,)
+        return pedido
+
+    def eliminar(self, numero_pedido: str) -> Optional[Pedido]:
+        pedido = self.__por_numero.pop(numero_pedido, None)
+        if pedido is None:
+            return None
+        del self.__por_estado[pedido.get_estado()][numero_pedido]
+        del self.__por_cliente[pedido.get_cliente()][numero_pedido]
+        del self.__por_tipo[type(pedido)][numero_pedido]
+        pedido._repositorios = tuple(r for r in pedido._repositorios if r is not self)
+        return pedido
+
+    def _estado_cambiado(self, pedido: Pedido, numero: str, anterior: EstadoPedido, nuevo: EstadoPedido) -> None:
+        """Llamado por Pedido tras una transición válida o al restaurar su estado"""
+        por_estado = self.__por_estado
+        del por_estado[anterior][numero]
+        por_estado[nuevo][numero] = pedido
+
+    def cambiar_estado_lote(self, cambios: Iterable[Tuple[str, EstadoPedido]],
+                            errores: Optional[List] = None) -> List[bool]:
+        """Como Pedido.cambiar_estado_lote pero por número de pedido; un número desconocido da False"""
+        por_numero = self.__por_numero
+        fallos = [] if errores is None else errores
+        resultados = []
+        for numero, nuevo_estado in cambios:
+            pedido = por_numero.get(numero)
+            resultados.append(pedido is not None and pedido._aplicar_transicion(nuevo_estado, fallos))
+        Pedido._verificar_fallos_lote(fallos, errores)
+        return resultados
+
+    # Consultas
+    def obtener(self, numero_pedido: str) -> Optional[Pedido]:
+        return self.__por_numero.get(numero_pedido)
+
+    def por_estado(self, estado: EstadoPedido) -> List[Pedido]:
+        return list(self.__por_estado[estado].values())
+
+    def por_cliente(self, cliente: str) -> List[Pedido]:
+        return list(self.__por_cliente.get(cliente, {}).values())
+
+    def por_tipo(self, tipo: type) -> List[Pedido]:
+        """Incluye subclases de tipo (por ejemplo, Pedido devuelve todos)"""
+        return [pedido for clase, pedidos in self.__por_tipo.items() if issubclass(clase, tipo)
+                for pedido in pedidos.values()]
+
+    def contar(self, estado: EstadoPedido) -> int:
+        return len(self.__por_estado[estado])
+
+    def contar_por_estado(self) -> Dict[EstadoPedido, int]:
+        return {estado: len(self.__por_estado[estado]) for estado in EstadoPedido}
+
+    def __len__(self) -> int:
+        return len(self.__por_numero)
+
+    def __contains__(self, numero_pedido: str) -> bool:
+        return numero_pedido in self.__por_numero
+
+    def __iter__(self):
+        return iter(self.__por_numero.values())
+
+
+# =============================================
+# BITÁCORA DURABLE DE ESTADOS (event sourcing)
+# =============================================
+class BitacoraEstados:
+    """
+    Registra cada transición de estado en disco, solo agregando al final:
+
+    - <ruta>          registros binarios de tamaño fijo (marca de tiempo, id, estado)
+    - <ruta>.pedidos  un número de pedido por línea; la línea i es el id i
+    - <ruta>.snapshot columnas de estado y marcas de tiempo hasta cierto byte del log
+
+    Al abrir se carga el snapshot y solo se reproduce la cola del log. Como la
+    máquina de estados no tiene ciclos, cada estado se alcanza a lo sumo una vez
+    por pedido: la línea de tiempo se guarda como una columna de marcas por estado.
+    """
+
+    REGISTRO = struct.Struct("<dIB")
+    CABECERA_SNAPSHOT = struct.Struct("<8sQQ")
+    MAGICO = b"BITEST01"
+
+    def __init__(self, ruta: str, lote_fsync: int = 1000, intervalo_fsync: float = 1.0):
+        self.ruta = ruta
+        self.lote_fsync = lote_fsync
+        self.intervalo_fsync = intervalo_fsync
+        self.__ids: Dict[str, int] = {}
+        self.__numeros: List[str] = []
+        self.__estados = array("B")
+        self.__marcas = [array("d") for _ in EstadoPedido]
+        self.__pendientes = 0
+        self.__ultimo_fsync = time.monotonic()
+        self.__desconectar: Optional[Callable[[], None]] = None
+        self.__cargar()
+        self.__log = open(ruta, "ab")
+        self.__archivo_numeros = open(ruta + ".pedidos", "a", encoding="utf-8")
+
+    # ---- reconstrucción ----
+    def __cargar(self) -> None:
+        if os.path.exists(self.ruta + ".pedidos"):
+            with open(self.ruta + ".pedidos", encoding="utf-8") as archivo:
+                self.__numeros = archivo.read().splitlines()
+        desplazamiento = 0
+        cubiertos = 0
+        if os.path.exists(self.ruta + ".snapshot"):
+            with open(self.ruta + ".snapshot", "rb") as archivo:
+                magico, cubiertos, desplazamiento = self.CABECERA_SNAPSHOT.unpack(
+                    archivo.read(self.CABECERA_SNAPSHOT.size)
+                )
+                if magico != self.MAGICO:
+                    raise ValueError(f"Snapshot inválido: {self.ruta}.snapshot")
+                self.__estados.fromfile(archivo, cubiertos)
+                for columna in self.__marcas:
+                    columna.fromfile(archivo, cubiertos)
+        # Ids registrados después del snapshot: arrancan en PENDIENTE y sin marcas
+        self.__crecer(len(self.__numeros))
+        self.__ids = {numero: i for i, numero in enumerate(self.__numeros)}
+        if os.path.exists(self.ruta):
+            with open(self.ruta, "rb") as archivo:
+                archivo.seek(desplazamiento)
+                cola = archivo.read()
+            # Un registro truncado al final (caída a mitad de escritura) se descarta
+            completos = len(cola) - len(cola) % self.REGISTRO.size
+            estados, marcas = self.__estados, self.__marcas
+            for marca, id_pedido, indice in self.REGISTRO.iter_unpack(cola[:completos]):
+                estados[id_pedido] = indice
+                marcas[indice][id_pedido] = marca
+            if completos != len(cola):
+                with open(self.ruta, "r+b") as archivo:
+                    archivo.truncate(desplazamiento + completos)
+
+    def __crecer(self, total: int) -> None:
+        faltan = total - len(self.__estados)
+        if faltan > 0:
+            self.__estados.extend(bytes(faltan))
+            for columna in self.__marcas:
+                columna.extend(array("d", [math.nan]) * faltan)
+
+    # ---- escritura ----
+    def conectar(self) -> None:
+        """Registra la bitácora como hook de Pedido: cada transición válida queda en disco"""
+        if self.__desconectar is None:
+            self.__desconectar = Pedido.registrar_hook(self._hook)
+
+    def desconectar(self) -> None:
+        if self.__desconectar is not None:
+            self.__desconectar()
+            self.__desconectar = None
+
+    def _hook(self, pedido: Pedido, anterior: EstadoPedido, nuevo: EstadoPedido) -> None:
+        numero = pedido.get_numero_pedido()
+        if numero not in self.__ids:
+            # Primera vez que se ve el pedido: su alta (PENDIENTE) queda con la fecha de creación
+            self.registrar_transicion(numero, EstadoPedido.PENDIENTE, pedido.get_fecha().timestamp())
+        self.registrar_transicion(numero, nuevo)
+
+    def registrar_transicion(self, numero: str, estado: EstadoPedido, marca: Optional[float] = None) -> None:
+        marca = time.time() if marca is None else marca
+        id_pedido = self.__ids.get(numero)
+        if id_pedido is None:
+            id_pedido = self.__ids[numero] = len(self.__numeros)
+            self.__numeros.append(numero)
+            self.__crecer(id_pedido + 1)
+            self.__archivo_numeros.write(numero + "\n")
+        indice = INDICE_ESTADO[estado]
+        self.__estados[id_pedido] = indice
+        self.__marcas[indice][id_pedido] = marca
+        self.__log.write(self.REGISTRO.pack(marca, id_pedido, indice))
+        self.__pendientes += 1
+        if self.__pendientes >= self.lote_fsync or time.monotonic() - self.__ultimo_fsync >= self.intervalo_fsync:
+            self.sincronizar()
+
+    def sincronizar(self) -> None:
+        """Vacía buffers y hace fsync; los números van primero porque el log los referencia"""
+        for archivo in (self.__archivo_numeros, self.__log):
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        self.__pendientes = 0
+        self.__ultimo_fsync = time.monotonic()
+
+    def snapshot(self) -> None:
+        """Escribe las columnas completas; se reemplaza de forma atómica el snapshot anterior"""
+        self.sincronizar()
+        destino = self.ruta + ".snapshot"
+        temporal = destino + ".tmp"
+        with open(temporal, "wb") as archivo:
+            archivo.write(self.CABECERA_SNAPSHOT.pack(self.MAGICO, len(self.__numeros), self.__log.tell()))
+            self.__estados.tofile(archivo)
+            for columna in self.__marcas:
+                columna.tofile(archivo)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, destino)
+
+    def cerrar(self) -> None:
+        self.sincronizar()
+        self.__log.close()
+        self.__archivo_numeros.close()
+
+    # ---- consultas ----
+    def __len__(self) -> int:
+        return len(self.__numeros)
+
+    def estado(self, numero: str) -> Optional[EstadoPedido]:
+        id_pedido = self.__ids.get(numero)
+        return None if id_pedido is None else ESTADOS_POR_INDICE[self.__estados[id_pedido]]
+
+    def restaurar(self, pedidos: Iterable[Pedido]) -> int:
+        """Devuelve a los pedidos el último estado registrado; retorna cuántos se restauraron"""
+        restaurados = 0
+        for pedido in pedidos:
+            estado = self.estado(pedido.get_numero_pedido())
+            if estado is not None:
+                pedido._restaurar_estado(estado)
+                restaurados += 1
+        return restaurados
+
+    def linea_tiempo(self, numero: str) -> List[Tuple[EstadoPedido, datetime]]:
+        id_pedido = self.__ids.get(numero)
+        if id_pedido is None:
+            return []
+        eventos = [(columna[id_pedido], indice) for indice, columna in enumerate(self.__marcas)
+                   if not math.isnan(columna[id_pedido])]
+        return [(ESTADOS_POR_INDICE[indice], datetime.fromtimestamp(marca)) for marca, indice in sorted(eventos)]
+
+    def tiempo_entre(self, numero: str, desde: EstadoPedido, hasta: EstadoPedido) -> Optional[timedelta]:
+        id_pedido = self.__ids.get(numero)
+        if id_pedido is None:
+            return None
+        segundos = self.__marcas[INDICE_ESTADO[hasta]][id_pedido] - self.__marcas[INDICE_ESTADO[desde]][id_pedido]
+        return None if math.isnan(segundos) else timedelta(seconds=segundos)
+
+    def tiempos_entre(self, desde: EstadoPedido, hasta: EstadoPedido) -> array:
+        """Segundos entre dos estados para todos los pedidos que pasaron por ambos"""
+        inicio, fin = self.__marcas[INDICE_ESTADO[desde]], self.__marcas[INDICE_ESTADO[hasta]]
+        return array("d", [b - a for a, b in zip(inicio, fin) if b == b and a == a])
+
+
+
+# =============================================
+# COTIZACIÓN DE ENVÍOS EN LOTE
+# =============================================
+class CotizadorEnvios:
+    """
+    Cotiza los cuatro tipos de envío para muchos carritos sin crear un pedido por
+    carrito ni por tipo. Es un bucle de Python sobre un array de subtotales, no un
+    cálculo vectorizado: lo que se ahorra es construir objetos.
+
+    Cotiza con los valores de clase, que son los que recibe un pedido nuevo. Si un
+    pedido ya creado cambió sus parámetros (por ejemplo costo_envio_fijo), su costo
+    es el de pedido.desglose_costos(). Las fórmulas de envío, impuestos y total son
+    las mismas que usan las subclases.
+    """
+
+    TIPOS = (PedidoEstandar, PedidoExpress, PedidoRetiroTienda, PedidoInternacional)
+
+    def __init__(self):
+        # Los tiempos de entrega no dependen del carrito
+        self.tiempos = {tipo.__name__: tipo.tiempo_entrega_por_defecto() for tipo in self.TIPOS}
+
+    @staticmethod
+    def subtotales(carritos: Iterable[List[Dict]]) -> array:
+        return array("d", [sum(producto['precio'] * producto.get('cantidad', 1) for producto in carrito)
+                           for carrito in carritos])
+
+    def cotizar(self, carritos: Iterable[List[Dict]], paises: Optional[Iterable[str]] = None) -> Dict:
+        """
+        Devuelve {'subtotal': array, tipo: {'costo_total': array, 'tiempo_entrega': str}};
+        el envío internacional solo se cotiza si se indica el país de cada carrito.
+        """
+        subtotales = self.subtotales(carritos)
+        total = Pedido._componer_total
+        envio_fijo = PedidoEstandar.COSTO_ENVIO_FIJO
+        recargo = PedidoExpress.RECARGO_EXPRESS
+        resultado = {
+            'subtotal': subtotales,
+            'PedidoEstandar': {'costo_total': array("d", [total(s, envio_fijo, 0.0) for s in subtotales])},
+            'PedidoExpress': {'costo_total': array("d", [total(s, recargo, 0.0) for s in subtotales])},
+            'PedidoRetiroTienda': {'costo_total': array("d", [total(s, 0.0, 0.0) for s in subtotales])},
+        }
+        if paises is not None:
+            tasa = PedidoInternacional.IMPUESTOS_IMPORTACION
+            envio_pais = PedidoInternacional.costo_envio_pais
+            impuestos = PedidoInternacional.calcular_impuestos
+            envios = [envio_pais(pais) for pais in paises]
+            if len(envios) != len(subtotales):
+                raise ValueError("Se necesita un país por carrito")
+            resultado['PedidoInternacional'] = {
+                'costo_total': array("d", [total(s, e, impuestos(s, tasa)) for s, e in zip(subtotales, envios)])
+            }
+        for tipo, cotizacion in resultado.items():
+            if tipo != 'subtotal':
+                cotizacion['tiempo_entrega'] = self.tiempos[tipo]
+        return resultado
 
 
 # =============================================
@@ -423,6 +1012,7 @@ def simular_flujo_pedidos():
         PedidoInternacional("INT-100", "Robert Wilson", productos_electronica, "456 Oak St, Chicago", "EEUU"),
         PedidoInternacional("INT-101", "Emma Davis", productos_libreria, "789 Maple Ave, Toronto", "Canada")
     ]
+    repositorio = RepositorioPedidos(todos_los_pedidos)
     
     # Simular flujo de estados y mostrar resúmenes
     for i, pedido in enumerate(todos_los_pedidos):
@@ -450,11 +1040,155 @@ def simular_flujo_pedidos():
         print(f"⏰ Tiempo: {resumen['tiempo_entrega']}")
         print(f"📢 Notificación: {resumen['notificacion']}")
 
+    # Rastreo de estados desde el repositorio (sin recorrer la lista de pedidos)
+    print(f"\n{'='*50}")
+    print("📊 PEDIDOS POR ESTADO")
+    print(f"{'='*50}")
+    for estado, cantidad in repositorio.contar_por_estado().items():
+        print(f"{estado.value}: {cantidad}")
+    enviados = [pedido.get_numero_pedido() for pedido in repositorio.por_estado(EstadoPedido.ENVIADO)]
+    print(f"🚚 Enviados: {', '.join(enviados)}")
+    return repositorio
+
+
+# =============================================
+# BENCHMARK: transiciones una a una vs en lote
+# =============================================
+def benchmark_transiciones(cantidad: int = 200_000):
+    """Compara cambiar_estado (con print) contra cambiar_estado_lote sobre el mismo flujo"""
+    print("BENCHMARK DE TRANSICIONES DE ESTADO")
+    print("=" * 60)
+    productos = [{'nombre': 'Item', 'precio': 10.0, 'cantidad': 1}]
+    flujo = (EstadoPedido.CONFIRMADO, EstadoPedido.PREPARACION, EstadoPedido.ENVIADO, EstadoPedido.ENTREGADO)
+
+    def crear_repositorio():
+        return RepositorioPedidos(
+            PedidoEstandar(f"P-{i}", f"Cliente {i % 1000}", productos, "Calle 1") for i in range(cantidad)
+        )
+
+    repositorio = crear_repositorio()
+    inicio = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for estado in flujo:
+            for pedido in repositorio:
+                pedido.cambiar_estado(estado)
+    t_individual = time.perf_counter() - inicio
+
+    repositorio = crear_repositorio()
+    numeros = [f"P-{i}" for i in range(cantidad)]
+    inicio = time.perf_counter()
+    for estado in flujo:
+        resultados = repositorio.cambiar_estado_lote((numero, estado) for numero in numeros)
+    t_lote = time.perf_counter() - inicio
+
+    transiciones = cantidad * len(flujo)
+    print(f"Transiciones: {transiciones}")
+    print(f"Una a una:    {t_individual:.2f} s")
+    print(f"En lote:      {t_lote:.2f} s ({transiciones / t_lote:,.0f}/s)")
+    print(f"Entregados:   {repositorio.contar(EstadoPedido.ENTREGADO)} - todos válidos: {all(resultados)}")
+
+
+def benchmark_bitacora(cantidad: int = 1_000_000):
+    """Escribe el flujo completo de cantidad pedidos y mide la reconstrucción con y sin snapshot"""
+    print("BENCHMARK DE BITÁCORA DE ESTADOS")
+    print("=" * 60)
+    flujo = (EstadoPedido.PENDIENTE, EstadoPedido.CONFIRMADO, EstadoPedido.PREPARACION,
+             EstadoPedido.ENVIADO, EstadoPedido.ENTREGADO)
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "estados.log")
+        bitacora = BitacoraEstados(ruta, lote_fsync=100_000)
+        numeros = [f"P-{i}" for i in range(cantidad)]
+        inicio = time.perf_counter()
+        marca = time.time()
+        for paso, estado in enumerate(flujo):
+            for numero in numeros:
+                bitacora.registrar_transicion(numero, estado, marca + paso * 3600)
+        bitacora.cerrar()
+        t_escritura = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        BitacoraEstados(ruta).cerrar()
+        t_log = time.perf_counter() - inicio
+
+        bitacora = BitacoraEstados(ruta)
+        bitacora.snapshot()
+        bitacora.cerrar()
+        inicio = time.perf_counter()
+        bitacora = BitacoraEstados(ruta)
+        t_snapshot = time.perf_counter() - inicio
+        horas = bitacora.tiempos_entre(EstadoPedido.CONFIRMADO, EstadoPedido.ENTREGADO)
+        bitacora.cerrar()
+    print(f"Escritura:  {cantidad * len(flujo)} registros en {t_escritura:.2f} s")
+    print(f"Replay del log completo: {t_log:.2f} s")
+    print(f"Desde snapshot:          {t_snapshot:.2f} s")
+    print(f"CONFIRMADO -> ENTREGADO promedio: {sum(horas) / len(horas) / 3600:.1f} h en {len(horas)} pedidos")
+
+
+def benchmark_resumen(lineas: int = 5_000, repeticiones: int = 1_000):
+    """Resumen repetido de un pedido B2B grande: solo el primero recorre las líneas"""
+    print("BENCHMARK DE RESUMEN CON CACHÉ")
+    print("=" * 60)
+    productos = [{'nombre': f'Item {i}', 'precio': 1.0 + i % 50, 'cantidad': 1 + i % 7} for i in range(lineas)]
+    pedido = PedidoInternacional("B2B-001", "Gran Corp", productos, "Av. Industrial 1", "Europa")
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resumen = pedido.obtener_resumen()
+    t_cache = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for _ in range(repeticiones // 10):
+        pedido._invalidar_costos()
+        pedido.obtener_resumen()
+    t_sin_cache = (time.perf_counter() - inicio) * 10
+    print(f"{lineas} líneas, {repeticiones} resúmenes")
+    print(f"Con caché: {t_cache * 1000:.1f} ms")
+    print(f"Sin caché: {t_sin_cache * 1000:.1f} ms (estimado)")
+    print(f"Total: ${resumen['costo_total']:,.2f}")
+
+
+def benchmark_cotizaciones(carritos: int = 100_000):
+    """Cotiza los cuatro envíos para cada carrito: pedido por pedido vs CotizadorEnvios"""
+    print("BENCHMARK DE COTIZACIÓN DE ENVÍOS")
+    print("=" * 60)
+    paises_posibles = ["EEUU", "Canada", "Mexico", "Europa", "UK", "Chile", "Japon"]
+    lista = [
+        [{'nombre': f'Item {j}', 'precio': round(5.0 + (i * 7 + j * 13) % 500 * 0.37, 2), 'cantidad': 1 + (i + j) % 4}
+         for j in range(1 + i % 5)]
+        for i in range(carritos)
+    ]
+    paises = [paises_posibles[i % len(paises_posibles)] for i in range(carritos)]
+
+    inicio = time.perf_counter()
+    individuales = [
+        (PedidoEstandar("C", "c", carrito, "d").calcular_costo_total(),
+         PedidoExpress("C", "c", carrito, "d").calcular_costo_total(),
+         PedidoRetiroTienda("C", "c", carrito, "t").calcular_costo_total(),
+         PedidoInternacional("C", "c", carrito, "d", pais).calcular_costo_total())
+        for carrito, pais in zip(lista, paises)
+    ]
+    t_individual = time.perf_counter() - inicio
+
+    cotizador = CotizadorEnvios()
+    inicio = time.perf_counter()
+    lote = cotizador.cotizar(lista, paises)
+    t_lote = time.perf_counter() - inicio
+
+    columnas = zip(lote['PedidoEstandar']['costo_total'], lote['PedidoExpress']['costo_total'],
+                   lote['PedidoRetiroTienda']['costo_total'], lote['PedidoInternacional']['costo_total'])
+    print(f"Carritos: {carritos} (4 cotizaciones cada uno)")
+    print(f"Pedido por pedido: {t_individual:.2f} s")
+    print(f"En lote:           {t_lote:.2f} s")
+    print(f"Resultados idénticos: {list(columnas) == individuales}")
+
 
 # =============================================
 # EJECUCIÓN PRINCIPAL
 # =============================================
-if __name__ == "__main__":
+if __name__ == "__main__" and "--benchmark" in sys.argv:
+    benchmark_transiciones()
+    benchmark_bitacora()
+    benchmark_resumen()
+    benchmark_cotizaciones()
+elif __name__ == "__main__":
     # Demostración del polimorfismo
     demostrar_polimorfismo_pedidos()
     
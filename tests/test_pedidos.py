@@ -0,0 +1,106 @@
+"""
+Pruebas de Ejercicio_3.3.py: transiciones, hooks y restauración de estados
+desde la bitácora sin desincronizar los índices del repositorio.
+"""
+import importlib.util
+import os
+import tempfile
+import unittest
+
+RUTA_MODULO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Ejercicio_3.3.py")
+_spec = importlib.util.spec_from_file_location("ejercicio_3_3", RUTA_MODULO)
+pedidos = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(pedidos)
+
+EstadoPedido = pedidos.EstadoPedido
+
+
+def _nuevo_pedido(numero):
+    return pedidos.PedidoEstandar(numero, "Cliente", [{'nombre': 'Item', 'precio': 10.0, 'cantidad': 1}], "Calle 1")
+
+
+class TestTransiciones(unittest.TestCase):
+    def test_estado_que_no_es_enum_da_type_error(self):
+        pedido = _nuevo_pedido("P-1")
+        with self.assertRaises(TypeError):
+            pedido.cambiar_estado("Confirmado")
+        self.assertIs(pedido.get_estado(), EstadoPedido.PENDIENTE)
+
+    def test_hook_por_clase_y_quitar(self):
+        vistos = []
+        quitar = pedidos.PedidoExpress.registrar_hook(lambda pedido, anterior, nuevo: vistos.append(pedido))
+        try:
+            estandar = _nuevo_pedido("P-1")
+            express = pedidos.PedidoExpress("P-2", "Cliente", [{'nombre': 'Item', 'precio': 10.0}], "Calle 1")
+            pedidos.Pedido.cambiar_estado_lote([(estandar, EstadoPedido.CONFIRMADO), (express, EstadoPedido.CONFIRMADO)])
+        finally:
+            quitar()
+        self.assertEqual(vistos, [express])
+        self.assertEqual(pedidos.Pedido._hooks_transicion, ())
+
+    def test_hook_que_falla_no_corta_el_lote(self):
+        def falla(pedido, anterior, nuevo):
+            raise RuntimeError("transportista caído")
+
+        quitar = pedidos.Pedido.registrar_hook(falla)
+        try:
+            lote = [_nuevo_pedido(f"P-{i}") for i in range(3)]
+            repositorio = pedidos.RepositorioPedidos(lote)
+            errores = []
+            resultados = repositorio.cambiar_estado_lote(
+                [(f"P-{i}", EstadoPedido.CONFIRMADO) for i in range(3)], errores)
+            self.assertEqual(resultados, [True, True, True])
+            self.assertEqual(len(errores), 3)
+            self.assertEqual(repositorio.contar(EstadoPedido.CONFIRMADO), 3)
+            with self.assertRaises(RuntimeError):
+                pedidos.Pedido.cambiar_estado_lote([(pedido, EstadoPedido.PREPARACION) for pedido in lote])
+            self.assertEqual(repositorio.contar(EstadoPedido.PREPARACION), 3)
+        finally:
+            quitar()
+
+
+class TestRestaurarEstados(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.carpeta.name, "estados.log")
+
+    def tearDown(self):
+        self.carpeta.cleanup()
+
+    def test_restaurar_y_cambiar_estado_mantiene_repositorio(self):
+        bitacora = pedidos.BitacoraEstados(self.ruta)
+        bitacora.registrar_transicion("P-1", EstadoPedido.PENDIENTE)
+        bitacora.registrar_transicion("P-1", EstadoPedido.CONFIRMADO)
+        bitacora.registrar_transicion("P-1", EstadoPedido.PREPARACION)
+        bitacora.cerrar()
+
+        pedido = _nuevo_pedido("P-1")
+        repositorio = pedidos.RepositorioPedidos([pedido])
+        bitacora = pedidos.BitacoraEstados(self.ruta)
+        try:
+            self.assertEqual(bitacora.restaurar([pedido]), 1)
+        finally:
+            bitacora.cerrar()
+
+        self.assertIs(pedido.get_estado(), EstadoPedido.PREPARACION)
+        self.assertEqual(repositorio.contar(EstadoPedido.PENDIENTE), 0)
+        self.assertEqual(repositorio.por_estado(EstadoPedido.PREPARACION), [pedido])
+
+        self.assertEqual(repositorio.cambiar_estado_lote([("P-1", EstadoPedido.ENVIADO)]), [True])
+        self.assertEqual(repositorio.contar(EstadoPedido.PREPARACION), 0)
+        self.assertEqual(repositorio.contar(EstadoPedido.ENVIADO), 1)
+
+    def test_restaurar_mismo_estado_no_toca_indices(self):
+        bitacora = pedidos.BitacoraEstados(self.ruta)
+        bitacora.registrar_transicion("P-2", EstadoPedido.PENDIENTE)
+        pedido = _nuevo_pedido("P-2")
+        repositorio = pedidos.RepositorioPedidos([pedido])
+        try:
+            self.assertEqual(bitacora.restaurar([pedido]), 1)
+        finally:
+            bitacora.cerrar()
+        self.assertEqual(repositorio.contar(EstadoPedido.PENDIENTE), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()